@@ -0,0 +1,37 @@
+"""Add composite indexes for course content listing
+
+Revision ID: add_content_listing_indexes
+Revises: add_content_sha256
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_content_listing_indexes'
+down_revision = 'add_content_sha256'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Indexes matching (course_id, active) filters with each listing sort order
+    op.create_index('ix_cc_course_active_upload', 'course_content',
+                    ['course_id', 'active', sa.text('upload_date DESC')])
+    op.create_index('ix_cc_course_active_title', 'course_content',
+                    ['course_id', 'active', 'title'])
+    op.create_index('ix_cc_course_active_size', 'course_content',
+                    ['course_id', 'active', sa.text('file_size DESC')])
+    
+    # Content type filter used by content search
+    op.create_index('ix_cc_active_type', 'course_content', ['active', 'content_type'])
+
+
+def downgrade():
+    # Remove listing indexes
+    op.drop_index('ix_cc_active_type', table_name='course_content')
+    op.drop_index('ix_cc_course_active_size', table_name='course_content')
+    op.drop_index('ix_cc_course_active_title', table_name='course_content')
+    op.drop_index('ix_cc_course_active_upload', table_name='course_content')
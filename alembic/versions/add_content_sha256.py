@@ -0,0 +1,28 @@
+"""Add content hash for upload deduplication
+
+Revision ID: add_content_sha256
+Revises: add_content_title_lc
+Create Date: 2026-10-16 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_content_sha256'
+down_revision = 'add_content_title_lc'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Add SHA-256 column used to find identical uploads
+    op.add_column('course_content', sa.Column('sha256', sa.String(64), nullable=True))
+    op.create_index('ix_course_content_sha256', 'course_content', ['sha256'])
+
+
+def downgrade():
+    # Remove SHA-256 column
+    op.drop_index('ix_course_content_sha256', table_name='course_content')
+    op.drop_column('course_content', 'sha256')
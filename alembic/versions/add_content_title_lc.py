@@ -0,0 +1,29 @@
+"""Add lowercased content title for prefix search
+
+Revision ID: add_content_title_lc
+Revises: add_content_visibility
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_content_title_lc'
+down_revision = 'add_content_visibility'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Add lowercased title column and backfill existing rows
+    op.add_column('course_content', sa.Column('title_lc', sa.String(255), nullable=True))
+    op.execute("UPDATE course_content SET title_lc = lower(title)")
+    op.create_index('ix_course_content_title_lc', 'course_content', ['title_lc'])
+
+
+def downgrade():
+    # Remove lowercased title column
+    op.drop_index('ix_course_content_title_lc', table_name='course_content')
+    op.drop_column('course_content', 'title_lc')
@@ -0,0 +1,34 @@
+"""Add full-text search index for courses
+
+Revision ID: add_course_search_index
+Revises: add_content_listing_indexes
+Create Date: 2026-10-16 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_course_search_index'
+down_revision = 'add_content_listing_indexes'
+branch_labels = None
+depends_on = None
+
+
+# Must match COURSE_SEARCH_DOCUMENT in lms_api/models/course.py
+COURSE_SEARCH_DOCUMENT = "to_tsvector('simple', name || ' ' || short_name || ' ' || coalesce(description, ''))"
+
+
+def upgrade():
+    # GIN expression index for course full-text search (PostgreSQL only)
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(f"CREATE INDEX ix_courses_search ON courses USING GIN ({COURSE_SEARCH_DOCUMENT})")
+
+
+def downgrade():
+    # Remove course full-text search index
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("DROP INDEX IF EXISTS ix_courses_search")
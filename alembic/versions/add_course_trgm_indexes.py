@@ -0,0 +1,45 @@
+"""Add trigram indexes for course ILIKE search
+
+These back get_courses' default substring search (search_mode=substring),
+which filters name, short_name and description with ILIKE '%term%'.
+
+Revision ID: add_course_trgm_indexes
+Revises: content_data_json
+Create Date: 2026-10-16 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_course_trgm_indexes'
+down_revision = 'content_data_json'
+branch_labels = None
+depends_on = None
+
+
+TRGM_INDEXES = {
+    'ix_course_name_trgm': 'name',
+    'ix_course_short_name_trgm': 'short_name',
+    'ix_course_description_trgm': 'description',
+}
+
+
+def upgrade():
+    # Trigram GIN indexes let '%term%' ILIKE filters use an index (PostgreSQL only)
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for index_name, column in TRGM_INDEXES.items():
+        op.create_index(index_name, 'courses', [column],
+                        postgresql_using='gin',
+                        postgresql_ops={column: 'gin_trgm_ops'})
+
+
+def downgrade():
+    # Remove trigram indexes
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for index_name in TRGM_INDEXES:
+        op.drop_index(index_name, table_name='courses')
@@ -0,0 +1,36 @@
+"""Store course content data as JSON
+
+Revision ID: content_data_json
+Revises: add_course_search_index
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'content_data_json'
+down_revision = 'add_course_search_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows already hold json.dumps output, so they cast cleanly.
+    # SQLite stores JSON as text, so only PostgreSQL needs the type change.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.alter_column('course_content', 'content_data',
+                    type_=postgresql.JSONB(),
+                    postgresql_using='content_data::jsonb')
+
+
+def downgrade():
+    # Convert content data back to text
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.alter_column('course_content', 'content_data',
+                    type_=sa.Text(),
+                    postgresql_using='content_data::text')
@@ -1,6 +1,8 @@
 from pyramid.config import Configurator
 from pyramid.renderers import render_to_response
+from pyramid.settings import asbool
 from sqlalchemy import engine_from_config
+from sqlalchemy.pool import QueuePool
 from .models import DBSession, Base
 from .models.course import Course
 from .models.user import User
@@ -150,6 +152,13 @@ def main(global_config, **settings):
     config.add_view(global_options_view, route_name='login', request_method='OPTIONS', renderer='json')
     config.add_view(global_options_view, route_name='register', request_method='OPTIONS', renderer='json')
     
+    # orjson-backed JSON rendering for every renderer='json' view
+    from .renderers import OrjsonRenderer, orjson_body
+    config.add_renderer('json', OrjsonRenderer)
+    config.add_renderer('orjson', OrjsonRenderer)
+    # ...and for parsing request bodies (replaces webob's stdlib json_body)
+    config.add_request_method(orjson_body, 'json_body', reify=True)
+    
     # Add global error handling
     from .exceptions import ErrorHandler
     
@@ -165,11 +174,28 @@ def main(global_config, **settings):
     config.add_notfound_view(error_view, renderer='json')
     config.add_forbidden_view(error_view, renderer='json')
     
-    # Database setup
-    engine = engine_from_config(settings, 'sqlalchemy.')
+    # Database setup with a pooled engine (pool options can be overridden in the ini)
+    pool_options = {}
+    if not settings.get('sqlalchemy.url', '').startswith('sqlite'):
+        # Behind pgbouncer (transaction pooling) keep a small local pool and let
+        # pgbouncer own connection health instead of pinging on every checkout
+        pgbouncer = asbool(settings.get('lms.pgbouncer', False))
+        pool_options = {
+            'poolclass': QueuePool,
+            'pool_size': int(settings.get('sqlalchemy.pool_size', 5 if pgbouncer else 25)),
+            'max_overflow': int(settings.get('sqlalchemy.max_overflow', 5 if pgbouncer else 25)),
+            'pool_recycle': int(settings.get('sqlalchemy.pool_recycle', 1800)),
+            'pool_pre_ping': asbool(settings.get('sqlalchemy.pool_pre_ping', not pgbouncer)),
+            'pool_use_lifo': asbool(settings.get('sqlalchemy.pool_use_lifo', True)),
+            'pool_reset_on_return': settings.get('sqlalchemy.pool_reset_on_return', 'rollback'),
+        }
+    engine = engine_from_config(settings, 'sqlalchemy.', **pool_options)
     DBSession.configure(bind=engine)
     Base.metadata.bind = engine
     
+    # Release the scoped session at the end of every request
+    config.add_tween('lms_api.middleware.session_tween.dbsession_tween_factory')
+    
     # Routes (no /api prefix since app is mounted under /api)
     config.add_route('health', '/health')
     config.add_route('login', '/auth/login')
@@ -186,6 +212,7 @@ def main(global_config, **settings):
     config.add_route('course', '/courses/{course_id}')
     config.add_route('sync_courses', '/courses/sync')
     config.add_route('sync_status', '/sync/status')
+    config.add_route('sync_task_status', '/sync/status/{task_id}')
     config.add_route('force_sync', '/sync/force')
     config.add_route('sync_config', '/sync/config')
     
@@ -215,6 +242,7 @@ def main(global_config, **settings):
     config.add_route('moodle_notifications_unread_count', '/moodle/notifications/unread-count')
     config.add_route('moodle_file_upload', '/moodle/files/upload')
     config.add_route('moodle_file_attach', '/moodle/files/attach')
+    config.add_route('moodle_file_attach_batch', '/moodle/files/attach-batch')
     config.add_route('moodle_validate_file', '/moodle/validate-file')
     config.add_route('moodle_file_upload_course', '/moodle/courses/{course_id}/upload')
     config.add_route('moodle_instructor_dashboard', '/moodle/instructor/dashboard')
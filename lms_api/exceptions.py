@@ -46,6 +46,18 @@ class ValidationError(LMSException):
         super().__init__(message, 'VALIDATION_ERROR', details)
 
 
+class FileTooLargeError(LMSException):
+    """Upload exceeds the allowed size"""
+    
+    def __init__(self, message: str, max_size: int = None, size: int = None):
+        details = {}
+        if max_size is not None:
+            details['max_size'] = max_size
+        if size is not None:
+            details['size'] = size
+        super().__init__(message, 'FILE_TOO_LARGE', details)
+
+
 class AuthenticationError(LMSException):
     """Authentication-related errors"""
     
@@ -159,6 +171,7 @@ ERROR_CODE_HTTP_MAPPING = {
     'AUTH_ERROR': 401,
     'ACCESS_DENIED': 403,
     'RESOURCE_NOT_FOUND': 404,
+    'FILE_TOO_LARGE': 413,
     'RATE_LIMIT_ERROR': 429,
     'DATABASE_ERROR': 500,
     'FILE_ERROR': 500,
@@ -0,0 +1,19 @@
+"""
+Tween that returns the request's database connection to the pool.
+"""
+
+import logging
+
+from ..models import DBSession
+
+log = logging.getLogger(__name__)
+
+
+def dbsession_tween_factory(handler, registry):
+    """Remove the scoped session once the request is done"""
+    def dbsession_tween(request):
+        try:
+            return handler(request)
+        finally:
+            DBSession.remove()
+    return dbsession_tween
@@ -7,9 +7,37 @@ import logging
 
 log = logging.getLogger(__name__)
 
-DBSession = scoped_session(sessionmaker())
+# Objects stay usable after commit without a reload round trip
+DBSession = scoped_session(sessionmaker(expire_on_commit=False))
 Base = declarative_base()
 
+def build_row_serializer(cls, exclude=()):
+    """Compile a to_dict-style function for a model from its mapped columns
+    
+    The function body is generated once per class so serializing a row is a
+    single dict literal instead of a Python-level walk over the columns.
+    DateTime columns are rendered with isoformat(), matching the hand-written
+    to_dict methods.
+    """
+    from sqlalchemy import inspect
+    from sqlalchemy.types import DateTime
+    
+    items = []
+    for attr in inspect(cls).column_attrs:
+        if attr.key in exclude:
+            continue
+        if isinstance(attr.columns[0].type, DateTime):
+            expr = f"self.{attr.key}.isoformat() if self.{attr.key} else None"
+        else:
+            expr = f"self.{attr.key}"
+        items.append(f"        {attr.key!r}: {expr},")
+    
+    source = "def _to_dict(self):\n    return {\n" + "\n".join(items) + "\n    }\n"
+    namespace = {}
+    exec(compile(source, f"<{cls.__name__}._to_dict>", "exec"), namespace)
+    return namespace['_to_dict']
+
+
 def initialize_sql(engine):
     DBSession.configure(bind=engine)
     Base.metadata.bind = engine
@@ -1,8 +1,8 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, LargeBinary
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, LargeBinary, Index, JSON
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql import func
-from . import Base
-import json
+from . import Base, build_row_serializer
 import os
 
 
@@ -12,12 +12,14 @@ class CourseContent(Base):
     id = Column(Integer, primary_key=True)
     course_id = Column(String(100), ForeignKey('courses.course_id'), nullable=False)
     title = Column(String(255), nullable=False)
+    title_lc = Column(String(255), index=True)  # Lowercased title for prefix search
     content_type = Column(String(50), nullable=False)  # 'file', 'text', 'url'
-    content_data = Column(Text)  # JSON data or text content
+    content_data = Column(JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), 'postgresql'))  # JSON data (url/text payloads)
     file_path = Column(String(500))  # Path to uploaded file
     file_name = Column(String(255))  # Original filename
     file_size = Column(Integer)  # File size in bytes
     mime_type = Column(String(100))  # MIME type of file
+    sha256 = Column(String(64), index=True)  # Content hash for deduplicating uploads
     external_id = Column(String(100))  # ID in external LMS
     lms_resource_id = Column(String(100))  # Resource ID in LMS
     uploaded_by = Column(Integer, ForeignKey('users.id'), nullable=False)
@@ -28,54 +30,54 @@ class CourseContent(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # Composite indexes matching the content listing filters and sort orders
+    __table_args__ = (
+        Index('ix_cc_course_active_upload', 'course_id', 'active', upload_date.desc()),
+        Index('ix_cc_course_active_title', 'course_id', 'active', 'title'),
+        Index('ix_cc_course_active_size', 'course_id', 'active', file_size.desc()),
+        Index('ix_cc_active_type', 'active', 'content_type'),
+    )
+    
     # Relationships
     course = relationship("Course", backref="contents")
     user = relationship("User", backref="uploaded_content")
     
-    def to_dict(self):
-        content_data = {}
-        if self.content_data:
-            try:
-                content_data = json.loads(self.content_data)
-            except:
-                content_data = {'raw': self.content_data}
+    @validates('title')
+    def _sync_title_lc(self, key, value):
+        """Keep the lowercased search column in step with the title"""
+        self.title_lc = value.lower() if value else value
+        return value
+    
+    _to_dict = None
+    
+    @classmethod
+    def to_dict_fast(cls):
+        """Return the compiled row serializer, building it on first use"""
+        if cls._to_dict is None:
+            cls._to_dict = build_row_serializer(cls, exclude=('content_data', 'title_lc', 'sha256'))
+        return cls._to_dict
+    
+    def to_dict(self, include_data=True):
+        data = self.to_dict_fast()(self)
         
-        return {
-            'id': self.id,
-            'course_id': self.course_id,
-            'title': self.title,
-            'content_type': self.content_type,
-            'content_data': content_data,
-            'file_path': self.file_path,
-            'file_name': self.file_name,
-            'file_size': self.file_size,
-            'mime_type': self.mime_type,
-            'external_id': self.external_id,
-            'lms_resource_id': self.lms_resource_id,
-            'uploaded_by': self.uploaded_by,
-            'upload_date': self.upload_date.isoformat() if self.upload_date else None,
-            'visibility': self.visibility,
-            'access_level': self.access_level,
-            'active': self.active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-        }
+        if include_data:
+            data['content_data'] = self.content_data or {}
+        else:
+            data['content_data'] = None
+        return data
     
     @classmethod
     def from_dict(cls, data, user_id):
-        content_data_str = None
-        if data.get('content_data'):
-            content_data_str = json.dumps(data['content_data'])
-        
         return cls(
             course_id=data.get('course_id'),
             title=data.get('title'),
             content_type=data.get('content_type'),
-            content_data=content_data_str,
+            content_data=data.get('content_data') or None,
             file_path=data.get('file_path'),
             file_name=data.get('file_name'),
             file_size=data.get('file_size'),
             mime_type=data.get('mime_type'),
+            sha256=data.get('sha256'),
             external_id=data.get('external_id'),
             lms_resource_id=data.get('lms_resource_id'),
             uploaded_by=user_id,
@@ -1,9 +1,17 @@
 from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean
 from sqlalchemy.sql import func
-from . import Base
+from . import Base, build_row_serializer
 import json
 
 
+# name, short_name and description also carry pg_trgm GIN indexes on PostgreSQL
+# (add_course_trgm_indexes migration) backing the default substring search.
+
+# Full-text search document for courses. Matches the ix_courses_search GIN
+# expression index created on PostgreSQL, so it must stay byte-for-byte identical.
+COURSE_SEARCH_DOCUMENT = "to_tsvector('simple', name || ' ' || short_name || ' ' || coalesce(description, ''))"
+
+
 class Course(Base):
     __tablename__ = 'courses'
     
@@ -21,22 +29,17 @@ class Course(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    _to_dict = None
+    
+    @classmethod
+    def to_dict_fast(cls):
+        """Return the compiled row serializer, building it on first use"""
+        if cls._to_dict is None:
+            cls._to_dict = build_row_serializer(cls)
+        return cls._to_dict
+    
     def to_dict(self):
-        return {
-            'id': self.id,
-            'course_id': self.course_id,
-            'name': self.name,
-            'short_name': self.short_name,
-            'description': self.description,
-            'category': self.category,
-            'lms': self.lms,
-            'external_id': self.external_id,
-            'visibility': self.visibility,
-            'access_level': self.access_level,
-            'active': self.active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-        }
+        return self.to_dict_fast()(self)
     
     @classmethod
     def from_dict(cls, data):
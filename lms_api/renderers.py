@@ -0,0 +1,38 @@
+import orjson
+
+
+def _orjson_default(obj, request=None):
+    """Fallback encoder for objects orjson doesn't handle natively"""
+    if hasattr(obj, 'to_dict'):
+        # ORM models (Course, CourseContent) can be returned from views as-is
+        return obj.to_dict()
+    if hasattr(obj, '__json__'):
+        # Pyramid's JSON adapter protocol: __json__(self, request)
+        return obj.__json__(request)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def orjson_body(request):
+    """Decode request.body with orjson; installed as request.json_body
+
+    Raises ValueError (orjson.JSONDecodeError) on malformed or empty bodies,
+    like webob's json_body, so existing 'Invalid JSON' handling still applies.
+    """
+    return orjson.loads(request.body)
+
+
+class OrjsonRenderer:
+    """Pyramid renderer factory that serializes view results with orjson"""
+
+    def __init__(self, info=None):
+        self.info = info
+
+    def __call__(self, value, system):
+        request = system.get('request')
+        if request is not None:
+            response = request.response
+            if response.content_type == response.default_content_type:
+                response.content_type = 'application/json'
+        return orjson.dumps(
+            value, default=lambda obj: _orjson_default(obj, request), option=orjson.OPT_NAIVE_UTC
+        )
@@ -0,0 +1,171 @@
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from threading import Lock
+from typing import Any, Callable, Optional
+
+log = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls into one in-flight call
+
+    The first caller for a key runs the function; callers arriving while it
+    is running wait for and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._inflight = {}  # key -> Future
+        self._lock = Lock()
+
+    def do(self, key: str, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._inflight[key] = future
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+
+class ResponseCache:
+    """Small in-process TTL cache for rendered view responses
+
+    Holds at most max_entries keys; past that the least recently used entry
+    is evicted, so keys built from free-text query params can't grow it
+    without bound.
+    """
+
+    def __init__(self, default_ttl: int = 60, max_entries: int = 1024):
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, fresh_until, value), LRU first
+        self._refreshing = set()  # keys with a background refresh in flight
+        self._loads = SingleFlight()
+        self._lock = Lock()
+
+    @staticmethod
+    def make_key(prefix: str, params=None) -> str:
+        """Build a cache key from a prefix and a mapping of request params"""
+        if not params:
+            return f"{prefix}:"
+        items = sorted((str(k), str(v)) for k, v in params.items())
+        digest = hashlib.sha1(repr(items).encode('utf-8')).hexdigest()
+        return f"{prefix}:{digest}"
+
+    def _lookup(self, key: str):
+        """Return (value, is_fresh) for a live entry, or None; caller holds the lock"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, fresh_until, value = entry
+        now = time.monotonic()
+        if expires_at <= now:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value, fresh_until > now
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired"""
+        with self._lock:
+            found = self._lookup(key)
+        if found is None or not found[1]:
+            return None
+        return found[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None, stale_ttl: int = 0):
+        """Store a value for ttl seconds, then keep serving it stale for stale_ttl more"""
+        fresh_until = time.monotonic() + (ttl if ttl is not None else self.default_ttl)
+        with self._lock:
+            self._entries[key] = (fresh_until + stale_ttl, fresh_until, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key: str, loader: Callable[[], Any],
+                    ttl: Optional[int] = None, stale_ttl: int = 0) -> Any:
+        """Return the cached value, calling loader() to fill or refresh it
+
+        Fresh entries are returned as-is. Stale entries (within stale_ttl) are
+        returned immediately while one background thread reloads them. Missing
+        entries are loaded inline, once, however many requests miss together.
+        """
+        with self._lock:
+            found = self._lookup(key)
+        if found is not None:
+            value, is_fresh = found
+            if not is_fresh:
+                self._refresh_in_background(key, loader, ttl, stale_ttl)
+            return value
+
+        def load():
+            value = loader()
+            self.set(key, value, ttl=ttl, stale_ttl=stale_ttl)
+            return value
+
+        return self._loads.do(key, load)
+
+    def _refresh_in_background(self, key, loader, ttl, stale_ttl):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.set(key, loader(), ttl=ttl, stale_ttl=stale_ttl)
+            except Exception as e:
+                # Keep serving the stale value; the next stale read retries
+                log.warning("Background refresh of %s failed: %s", key, e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name='cache-refresh', daemon=True).start()
+
+    def invalidate_prefix(self, prefix: str):
+        """Drop every entry whose key starts with prefix"""
+        with self._lock:
+            stale = [key for key in self._entries if key.startswith(prefix)]
+            for key in stale:
+                del self._entries[key]
+        if stale:
+            log.debug("Invalidated %d cache entries for %s", len(stale), prefix)
+
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+
+
+# Global instances
+response_cache = ResponseCache()
+single_flight = SingleFlight()
+
+
+def get_response_cache():
+    """Get global response cache instance"""
+    return response_cache
+
+
+def get_single_flight():
+    """Get global single-flight call coalescer"""
+    return single_flight
@@ -1,10 +1,12 @@
 import os
+import io
 import uuid
+import hashlib
 import mimetypes
-from typing import Tuple, Optional, Dict, Any
+from typing import Tuple, Optional, Dict, Any, Callable, Union, BinaryIO
 import logging
 from werkzeug.utils import secure_filename
-from ..exceptions import FileError, ValidationError
+from ..exceptions import FileError, ValidationError, FileTooLargeError
 
 log = logging.getLogger(__name__)
 
@@ -99,27 +101,7 @@ class FileService:
             if file_size <= 0:
                 raise ValidationError("File is empty", field="file_size", value=file_size)
             
-            # Check filename
-            if not filename or filename.strip() == '':
-                raise ValidationError("Filename is required", field="filename")
-            
-            # Get file extension
-            file_ext = os.path.splitext(filename)[1][1:].lower()
-            
-            # Check extension
-            if file_ext not in self.ALLOWED_EXTENSIONS:
-                raise ValidationError(
-                    f"File type '{file_ext}' is not allowed. Allowed types: {', '.join(self.ALLOWED_EXTENSIONS)}",
-                    field="file_extension",
-                    value=file_ext
-                )
-            
-            # Check MIME type if provided
-            if mime_type and mime_type not in self.ALLOWED_MIME_TYPES:
-                # Sometimes browsers send different MIME types, so we'll log a warning but allow it
-                log.warning(f"Unexpected MIME type '{mime_type}' for file '{filename}'. Allowed based on extension.")
-            
-            return True, ""
+            return self.validate_filename(filename, mime_type)
             
         except ValidationError:
             # Re-raise ValidationError as-is
@@ -128,6 +110,42 @@ class FileService:
             log.error(f"Unexpected error during file validation: {str(e)}")
             raise FileError(f"File validation failed: {str(e)}", operation="validation")
     
+    def validate_filename(self, filename: str, mime_type: str = None) -> Tuple[bool, str]:
+        """
+        Validate an upload's name and MIME type without needing its size
+        
+        Args:
+            filename: Original filename
+            mime_type: MIME type of the file
+            
+        Returns:
+            Tuple of (is_valid, error_message)
+            
+        Raises:
+            ValidationError: If validation fails with detailed error info
+        """
+        # Check filename
+        if not filename or filename.strip() == '':
+            raise ValidationError("Filename is required", field="filename")
+        
+        # Get file extension
+        file_ext = os.path.splitext(filename)[1][1:].lower()
+        
+        # Check extension
+        if file_ext not in self.ALLOWED_EXTENSIONS:
+            raise ValidationError(
+                f"File type '{file_ext}' is not allowed. Allowed types: {', '.join(self.ALLOWED_EXTENSIONS)}",
+                field="file_extension",
+                value=file_ext
+            )
+        
+        # Check MIME type if provided
+        if mime_type and mime_type not in self.ALLOWED_MIME_TYPES:
+            # Sometimes browsers send different MIME types, so we'll log a warning but allow it
+            log.warning(f"Unexpected MIME type '{mime_type}' for file '{filename}'. Allowed based on extension.")
+        
+        return True, ""
+    
     def generate_unique_filename(self, original_filename: str) -> str:
         """Generate a unique filename to prevent conflicts"""
         # Secure the filename
@@ -142,14 +160,25 @@ class FileService:
         # Create new filename: name_uniqueID.ext
         return f"{name}_{unique_id}{ext}"
     
-    def save_file(self, file_data: bytes, filename: str, course_id: str) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+    # Read uploads in 1MB chunks when streaming them to disk
+    CHUNK_SIZE = 1024 * 1024
+    
+    def save_file(self, file_data: Union[bytes, BinaryIO], filename: str, course_id: str,
+                  find_duplicate: Optional[Callable[[str], Optional[str]]] = None,
+                  max_size: Optional[int] = None) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
         """
         Save file to disk
         
+        The upload is streamed to disk in a single pass that also computes its
+        size and SHA-256. If find_duplicate returns the path of an existing file
+        with the same hash, the new file is hard-linked to it instead.
+        
         Args:
-            file_data: File content as bytes
+            file_data: File content as bytes or a readable binary file object
             filename: Original filename
             course_id: Course ID for organization
+            find_duplicate: Optional lookup from SHA-256 hex digest to an existing file path
+            max_size: Raise FileTooLargeError once more than this many bytes are read (defaults to MAX_FILE_SIZE)
             
         Returns:
             Tuple of (success, error_message_or_path, file_info)
@@ -157,6 +186,11 @@ class FileService:
         Raises:
             FileError: If file operation fails
         """
+        if isinstance(file_data, (bytes, bytearray)):
+            file_data = io.BytesIO(file_data)
+        if max_size is None:
+            max_size = self.MAX_FILE_SIZE
+        
         try:
             # Create course-specific directory
             course_dir = os.path.join(self.upload_dir, course_id)
@@ -184,31 +218,61 @@ class FileService:
             file_path = os.path.abspath(os.path.join(course_dir, unique_filename))
             
             # Check available disk space
-            if hasattr(os, 'statvfs'):  # Unix-like systems
+            expected_size = self.get_stream_size(file_data)
+            if expected_size is not None and hasattr(os, 'statvfs'):  # Unix-like systems
                 stat = os.statvfs(course_dir)
                 available_space = stat.f_frsize * stat.f_avail
-                if len(file_data) > available_space:
+                if expected_size > available_space:
                     raise FileError(
                         "Insufficient disk space",
                         operation="save_file",
                         file_path=file_path
                     )
             
-            # Save file with atomic write
+            # Save file with atomic write, hashing and sizing in the same pass
             temp_path = file_path + '.tmp'
+            digest = hashlib.sha256()
+            file_size = 0
             try:
                 with open(temp_path, 'wb') as f:
-                    f.write(file_data)
+                    while True:
+                        chunk = file_data.read(self.CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        file_size += len(chunk)
+                        if file_size > max_size:
+                            # Stop copying as soon as the cap is passed
+                            raise FileTooLargeError(
+                                f"File size exceeds maximum limit of {max_size / (1024*1024):.0f}MB",
+                                max_size=max_size,
+                                size=file_size
+                            )
+                        digest.update(chunk)
+                        f.write(chunk)
                     f.flush()
                     os.fsync(f.fileno())  # Force write to disk
                 
+                if file_size == 0:
+                    raise ValidationError("File is empty", field="file_size", value=file_size)
+                
                 # Verify file was written successfully
-                if not os.path.exists(temp_path) or os.path.getsize(temp_path) != len(file_data):
+                if os.path.getsize(temp_path) != file_size:
                     raise FileError("File verification failed after write", operation="verify_file")
                 
-                # Atomic move to final location
-                os.rename(temp_path, file_path)
+                sha256 = digest.hexdigest()
+                duplicate_path = find_duplicate(sha256) if find_duplicate else None
+                if duplicate_path and self._link_duplicate(duplicate_path, file_path):
+                    os.remove(temp_path)
+                    log.info(f"Identical upload found, linked {file_path} to {duplicate_path}")
+                else:
+                    # Atomic move to final location
+                    os.rename(temp_path, file_path)
                 
+            except (ValidationError, FileTooLargeError):
+                # Clean up the partial upload
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
             except PermissionError:
                 # Clean up temp file if it exists
                 if os.path.exists(temp_path):
@@ -229,7 +293,6 @@ class FileService:
                 )
             
             # Get file info
-            file_size = len(file_data)
             mime_type, _ = mimetypes.guess_type(filename)
             
             file_info = {
@@ -237,14 +300,15 @@ class FileService:
                 'file_name': filename,
                 'unique_filename': unique_filename,
                 'file_size': file_size,
-                'mime_type': mime_type or 'application/octet-stream'
+                'mime_type': mime_type or 'application/octet-stream',
+                'sha256': sha256
             }
             
             log.info(f"File saved successfully: {file_path} ({file_size} bytes)")
             return True, file_path, file_info
             
-        except FileError:
-            # Re-raise FileError as-is
+        except (FileError, ValidationError, FileTooLargeError):
+            # Re-raise file/validation errors as-is
             raise
         except Exception as e:
             log.error(f"Unexpected error saving file: {str(e)}")
@@ -254,16 +318,36 @@ class FileService:
                 file_path=filename
             )
     
+    @staticmethod
+    def get_stream_size(stream) -> Optional[int]:
+        """Bytes left to read in a seekable stream, or None if unknown"""
+        try:
+            position = stream.tell()
+            end = stream.seek(0, os.SEEK_END)
+            stream.seek(position)
+            return end - position
+        except (AttributeError, OSError, ValueError):
+            return None
+    
+    @staticmethod
+    def _link_duplicate(existing_path: str, file_path: str) -> bool:
+        """Hard-link an existing identical file into place, returning False if not possible"""
+        try:
+            os.link(existing_path, file_path)
+            return True
+        except OSError as e:
+            log.warning(f"Could not link duplicate upload {existing_path}: {str(e)}")
+            return False
+    
     def delete_file(self, file_path: str) -> bool:
         """Delete file from disk"""
         try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                log.info(f"File deleted: {file_path}")
-                return True
-            else:
-                log.warning(f"File not found for deletion: {file_path}")
-                return False
+            os.remove(file_path)
+            log.info(f"File deleted: {file_path}")
+            return True
+        except FileNotFoundError:
+            log.warning(f"File not found for deletion: {file_path}")
+            return False
         except Exception as e:
             log.error(f"Error deleting file: {str(e)}")
             return False
@@ -27,6 +27,39 @@ class LMSIntegrationService:
         self.chamilo_url = os.getenv('CHAMILO_URL', '')
         self.chamilo_api_key = os.getenv('CHAMILO_API_KEY', '')
     
+    @staticmethod
+    def _save_synced_courses(course_rows):
+        """Insert new and update existing courses from a sync in bulk
+        
+        One SELECT finds which course_ids already exist, then the rows go
+        through bulk_insert_mappings / bulk_update_mappings instead of a
+        lookup and ORM add() per course. Returns (inserted, updated).
+        """
+        # Later entries win if the LMS returns the same course twice
+        rows_by_id = {row['course_id']: row for row in course_rows}
+        if not rows_by_id:
+            return 0, 0
+        
+        existing = dict(
+            DBSession.query(Course.course_id, Course.id)
+            .filter(Course.course_id.in_(list(rows_by_id)))
+            .all()
+        )
+        
+        new_rows = []
+        updated_rows = []
+        for course_id, row in rows_by_id.items():
+            if course_id in existing:
+                updated_rows.append(dict(row, id=existing[course_id]))
+            else:
+                new_rows.append(dict(row, visibility='private', access_level='enrolled', active=True))
+        
+        if new_rows:
+            DBSession.bulk_insert_mappings(Course, new_rows)
+        if updated_rows:
+            DBSession.bulk_update_mappings(Course, updated_rows)
+        return len(new_rows), len(updated_rows)
+    
     @retry_service.with_retry(max_attempts=3, backoff_factor=2.0, 
                              exceptions=(requests.RequestException, ServiceUnavailableError))
     @retry_service.circuit_breaker(failure_threshold=5, recovery_timeout=300)
@@ -52,8 +85,7 @@ class LMSIntegrationService:
             if 'exception' in moodle_courses:
                 raise Exception(f"Moodle API error: {moodle_courses['message']}")
             
-            synced_count = 0
-            updated_count = 0
+            course_rows = []
             
             for moodle_course in moodle_courses:
                 course_data = {
@@ -65,23 +97,9 @@ class LMSIntegrationService:
                     'lms': 'moodle',
                     'external_id': str(moodle_course['id'])
                 }
-                
-                existing_course = DBSession.query(Course).filter_by(
-                    course_id=course_data['course_id']
-                ).first()
-                
-                if existing_course:
-                    # Update existing course
-                    for key, value in course_data.items():
-                        if key != 'course_id':
-                            setattr(existing_course, key, value)
-                    updated_count += 1
-                else:
-                    # Create new course
-                    course = Course.from_dict(course_data)
-                    DBSession.add(course)
-                    synced_count += 1
+                course_rows.append(course_data)
             
+            synced_count, updated_count = self._save_synced_courses(course_rows)
             DBSession.commit()
             
             return {
@@ -124,8 +142,7 @@ class LMSIntegrationService:
             
             canvas_courses = response.json()
             
-            synced_count = 0
-            updated_count = 0
+            course_rows = []
             
             for canvas_course in canvas_courses:
                 course_data = {
@@ -137,23 +154,9 @@ class LMSIntegrationService:
                     'lms': 'canvas',
                     'external_id': str(canvas_course['id'])
                 }
-                
-                existing_course = DBSession.query(Course).filter_by(
-                    course_id=course_data['course_id']
-                ).first()
-                
-                if existing_course:
-                    # Update existing course
-                    for key, value in course_data.items():
-                        if key != 'course_id':
-                            setattr(existing_course, key, value)
-                    updated_count += 1
-                else:
-                    # Create new course
-                    course = Course.from_dict(course_data)
-                    DBSession.add(course)
-                    synced_count += 1
+                course_rows.append(course_data)
             
+            synced_count, updated_count = self._save_synced_courses(course_rows)
             DBSession.commit()
             
             return {
@@ -248,8 +251,7 @@ class LMSIntegrationService:
             sakai_data = response.json()
             sakai_sites = sakai_data.get('site_collection', [])
             
-            synced_count = 0
-            updated_count = 0
+            course_rows = []
             
             for sakai_site in sakai_sites:
                 # Filter for course sites (type 'course' or containing course indicators)
@@ -265,23 +267,9 @@ class LMSIntegrationService:
                     'lms': 'sakai',
                     'external_id': str(sakai_site['id'])
                 }
-                
-                existing_course = DBSession.query(Course).filter_by(
-                    course_id=course_data['course_id']
-                ).first()
-                
-                if existing_course:
-                    # Update existing course
-                    for key, value in course_data.items():
-                        if key != 'course_id':
-                            setattr(existing_course, key, value)
-                    updated_count += 1
-                else:
-                    # Create new course
-                    course = Course.from_dict(course_data)
-                    DBSession.add(course)
-                    synced_count += 1
+                course_rows.append(course_data)
             
+            synced_count, updated_count = self._save_synced_courses(course_rows)
             DBSession.commit()
             
             return {
@@ -352,8 +340,7 @@ class LMSIntegrationService:
             
             chamilo_courses = chamilo_data.get('data', [])
             
-            synced_count = 0
-            updated_count = 0
+            course_rows = []
             
             for chamilo_course in chamilo_courses:
                 course_data = {
@@ -365,23 +352,9 @@ class LMSIntegrationService:
                     'lms': 'chamilo',
                     'external_id': str(chamilo_course['id'])
                 }
-                
-                existing_course = DBSession.query(Course).filter_by(
-                    course_id=course_data['course_id']
-                ).first()
-                
-                if existing_course:
-                    # Update existing course
-                    for key, value in course_data.items():
-                        if key != 'course_id':
-                            setattr(existing_course, key, value)
-                    updated_count += 1
-                else:
-                    # Create new course
-                    course = Course.from_dict(course_data)
-                    DBSession.add(course)
-                    synced_count += 1
+                course_rows.append(course_data)
             
+            synced_count, updated_count = self._save_synced_courses(course_rows)
             DBSession.commit()
             
             return {
@@ -942,4 +915,12 @@ class LMSIntegrationService:
         
         except Exception as e:
             log.error(f"Error updating Chamilo course: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+# Global integration service instance
+lms_integration_service = LMSIntegrationService()
+
+
+def get_lms_integration_service():
+    """Get global LMS integration service instance"""
+    return lms_integration_service
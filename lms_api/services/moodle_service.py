@@ -5,12 +5,18 @@ Provides secure, typed access to Moodle web services with proper error handling,
 retry logic, and parameter encoding for Moodle's bracketed key syntax.
 """
 
+import base64
+import fastjsonschema
 import requests
+from requests.adapters import HTTPAdapter
+from requests_toolbelt import MultipartEncoder
 import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import os
-from urllib.parse import urlencode
-from typing import Dict, Any, List, Optional, Union
+from urllib.parse import urlencode, quote_plus
+from typing import Dict, Any, List, Optional, Tuple, Union, BinaryIO
 from functools import wraps
 import uuid
 import re
@@ -88,6 +94,74 @@ def log_moodle_request(func):
     return wrapper
 
 
+# Moodle IDs arrive either as JSON integers or numeric strings
+_POSITIVE_ID = {
+    'anyOf': [
+        {'type': 'integer', 'minimum': 1},
+        {'type': 'string', 'pattern': '^[1-9][0-9]*$'}
+    ]
+}
+
+# Compiled once at import; replaces per-item/per-field Python checks
+_validate_enrolment_schema = fastjsonschema.compile({
+    'type': 'array',
+    'items': {
+        'type': 'object',
+        'required': ['roleid', 'userid', 'courseid'],
+        'properties': {
+            'roleid': _POSITIVE_ID,
+            'userid': _POSITIVE_ID,
+            'courseid': _POSITIVE_ID
+        }
+    }
+})
+
+
+_ENROLMENT_INDEX = re.compile(r'data\[(\d+)\]')
+
+
+def validate_enrolments(enrolments: List[Dict[str, Any]]) -> None:
+    """
+    Validate enrolment objects against the compiled enrolment schema
+    
+    Raises:
+        MoodleValidationError: If any enrolment is missing a field or has a bad ID
+    """
+    try:
+        _validate_enrolment_schema(enrolments)
+    except fastjsonschema.JsonSchemaValueException as e:
+        # e.name is the failing path, e.g. 'data[3]' or 'data[3].userid'
+        index = _ENROLMENT_INDEX.match(e.name or '')
+        where = f" (enrolment {index.group(1)})" if index else ''
+        if e.rule == 'required' and isinstance(e.value, dict):
+            missing = [field for field in e.rule_definition if field not in e.value]
+            raise MoodleValidationError(f"Required field missing in enrolment: {', '.join(missing)}{where}")
+        raise MoodleValidationError(f"Invalid enrolment data: {e.message}{where}")
+
+
+def _stream_form_body(fields: Dict[str, str], name: str, file_obj: BinaryIO,
+                      chunk_size: int = 3 * 256 * 1024):
+    """
+    Yield a form-urlencoded body whose last field is file_obj base64-encoded
+    
+    The file is read and encoded one chunk at a time, so requests sends the
+    body with chunked transfer encoding and never holds it whole in memory.
+    """
+    yield (urlencode(fields) + '&' + quote_plus(name) + '=').encode('ascii')
+    
+    # Encode whole 3-byte groups only, so the pieces concatenate cleanly even
+    # when read() returns short
+    leftover = b''
+    for chunk in iter(lambda: file_obj.read(chunk_size), b''):
+        chunk = leftover + chunk
+        cut = len(chunk) - len(chunk) % 3
+        leftover = chunk[cut:]
+        if cut:
+            yield quote_plus(base64.b64encode(chunk[:cut])).encode('ascii')
+    if leftover:
+        yield quote_plus(base64.b64encode(leftover)).encode('ascii')
+
+
 class MoodleParamEncoder:
     """Utility class for encoding parameters in Moodle's bracketed key format"""
     
@@ -103,22 +177,25 @@ class MoodleParamEncoder:
         """
         result = {}
         
-        def _encode_recursive(obj, prefix=''):
-            if isinstance(obj, dict):
+        # Runs once per field of every row (e.g. 4x per enrolment), so the
+        # builtins are bound as defaults to make them fast local lookups
+        def _encode_recursive(obj, prefix='', _isinstance=isinstance, _dict=dict,
+                              _list=list, _bool=bool, _str=str, _enumerate=enumerate):
+            if _isinstance(obj, _dict):
                 for key, value in obj.items():
                     new_key = f"{prefix}[{key}]" if prefix else key
                     _encode_recursive(value, new_key)
-            elif isinstance(obj, list):
-                for i, item in enumerate(obj):
+            elif _isinstance(obj, _list):
+                for i, item in _enumerate(obj):
                     new_key = f"{prefix}[{i}]"
                     _encode_recursive(item, new_key)
             else:
                 # Handle boolean values for Moodle API
-                if isinstance(obj, bool):
+                if _isinstance(obj, _bool):
                     result[prefix] = '1' if obj else '0'
                 else:
                     # Convert to string, handle None values
-                    result[prefix] = str(obj) if obj is not None else ''
+                    result[prefix] = _str(obj) if obj is not None else ''
         
         _encode_recursive(data)
         return result
@@ -148,6 +225,12 @@ class MoodleService:
     - Token security (never logged or exposed)
     """
     
+    # Max values per core_user_get_users_by_field request (keeps POST bodies small)
+    USERS_BY_FIELD_BATCH_SIZE = 200
+    
+    # Fields core_course_create_courses rejects a course without
+    COURSE_REQUIRED_FIELDS = ('fullname', 'shortname', 'categoryid')
+    
     def __init__(self, base_url: str = None, token: str = None, timeout: int = 15000):
         """
         Initialize Moodle service
@@ -176,6 +259,12 @@ class MoodleService:
         
         # Convert timeout to seconds for requests library
         self.timeout_seconds = self.timeout / 1000.0
+        
+        # One pooled session per service so Moodle connections are kept alive
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=50)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
     
     def get_user_token(self, username: str, password: str, service: str = 'moodle_mobile_app') -> str:
         """
@@ -205,7 +294,7 @@ class MoodleService:
         }
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 token_url,
                 data=params,  # Use data instead of params for POST
                 timeout=self.timeout_seconds,
@@ -259,7 +348,8 @@ class MoodleService:
             return MoodleError(f"Moodle error: {message}", error_code, 500)
     
     def _make_request_with_retry(self, wsfunction: str, params: Dict[str, Any], 
-                                max_retries: int = 2) -> Any:
+                                max_retries: int = 2,
+                                stream: Optional[Tuple[str, BinaryIO]] = None) -> Any:
         """
         Make HTTP request with exponential backoff retry for idempotent operations
         
@@ -267,6 +357,9 @@ class MoodleService:
             wsfunction: Moodle web service function name
             params: Parameters for the function
             max_retries: Maximum number of retries (only for GET-like operations)
+            stream: Optional (field name, file-like object) sent base64-encoded
+                as the last form field without reading the file into memory.
+                A streamed body can only be sent once, so it is never retried.
             
         Returns:
             Moodle API response data
@@ -287,7 +380,7 @@ class MoodleService:
             'core_message_get_unread_popup_notifications_count'
         ]
         
-        is_idempotent = wsfunction in IDEMPOTENT_FUNCTIONS
+        is_idempotent = wsfunction in IDEMPOTENT_FUNCTIONS and stream is None
         retries = max_retries if is_idempotent else 0
         
         # Prepare request data
@@ -314,9 +407,9 @@ class MoodleService:
                         'max_retries': retries
                     })
                 
-                response = requests.post(
+                response = self.session.post(
                     self.base_url,
-                    data=request_data,
+                    data=_stream_form_body(request_data, *stream) if stream else request_data,
                     timeout=self.timeout_seconds,
                     headers={
                         'Content-Type': 'application/x-www-form-urlencoded',
@@ -360,13 +453,16 @@ class MoodleService:
         raise last_exception
     
     @log_moodle_request
-    def call(self, wsfunction: str, params: Dict[str, Any] = None) -> Any:
+    def call(self, wsfunction: str, params: Dict[str, Any] = None,
+             stream: Optional[Tuple[str, BinaryIO]] = None) -> Any:
         """
         Generic method to call any Moodle web service function
         
         Args:
             wsfunction: Moodle web service function name
             params: Parameters for the function
+            stream: Optional (field name, file-like object) to stream
+                base64-encoded as an extra parameter
             
         Returns:
             Moodle API response data
@@ -374,7 +470,7 @@ class MoodleService:
         Raises:
             MoodleError: For various error conditions
         """
-        return self._make_request_with_retry(wsfunction, params or {})
+        return self._make_request_with_retry(wsfunction, params or {}, stream=stream)
     
     # Typed helper methods
     
@@ -400,6 +496,26 @@ class MoodleService:
         result = self.call('core_course_get_courses')
         return result if isinstance(result, list) else []
     
+    def get_courses_by_field(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """
+        Get courses matching a single field, filtered server-side
+        
+        Args:
+            field: Moodle course field (id, ids, shortname, idnumber, category)
+            value: Value to match
+            
+        Returns:
+            List of course objects
+        """
+        params = {
+            'field': field,
+            'value': value
+        }
+        
+        result = self.call('core_course_get_courses_by_field', params)
+        courses = result.get('courses', []) if isinstance(result, dict) else result
+        return courses if isinstance(courses, list) else []
+    
     def create_course(self, course_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Create a new course
@@ -416,8 +532,7 @@ class MoodleService:
             - categoryid: Category ID (usually 1 for default)
         """
         # Validate required fields
-        required_fields = ['fullname', 'shortname', 'categoryid']
-        for field in required_fields:
+        for field in self.COURSE_REQUIRED_FIELDS:
             if field not in course_data:
                 raise MoodleValidationError(f"Required field missing: {field}")
         
@@ -458,13 +573,20 @@ class MoodleService:
         if not values:
             return []
         
-        params = {
-            'field': field,
-            'values': values
-        }
-        
-        result = self.call('core_user_get_users_by_field', params)
-        return result if isinstance(result, list) else []
+        # All values go out as values[0]..values[N] in one request; only very
+        # large lists are split into batches
+        users = []
+        batch_size = self.USERS_BY_FIELD_BATCH_SIZE
+        for start in range(0, len(values), batch_size):
+            params = {
+                'field': field,
+                'values': values[start:start + batch_size]
+            }
+            
+            result = self.call('core_user_get_users_by_field', params)
+            if isinstance(result, list):
+                users.extend(result)
+        return users
     
     def enrol_users(self, enrolments: List[Dict[str, Any]]) -> None:
         """
@@ -482,18 +604,7 @@ class MoodleService:
             return
         
         # Validate required fields and values
-        for i, enrolment in enumerate(enrolments):
-            required_fields = ['roleid', 'userid', 'courseid']
-            for field in required_fields:
-                if field not in enrolment:
-                    raise MoodleValidationError(f"Required field missing in enrolment {i}: {field}")
-                # Validate that IDs are positive integers
-                try:
-                    value = int(enrolment[field])
-                    if value <= 0:
-                        raise MoodleValidationError(f"Invalid {field} in enrolment {i}: must be positive integer")
-                except (ValueError, TypeError):
-                    raise MoodleValidationError(f"Invalid {field} in enrolment {i}: must be integer")
+        validate_enrolments(enrolments)
         
         params = {'enrolments': enrolments}
         return self.call('enrol_manual_enrol_users', params)
@@ -556,14 +667,17 @@ class MoodleService:
     
     # File handling methods
     
-    def upload_file(self, file_data: bytes, filename: str, contextid: int = 1, 
+    def upload_file(self, file_data: Union[bytes, BinaryIO], filename: str, contextid: int = 1, 
                    component: str = 'user', filearea: str = 'draft', 
                    itemid: int = 0) -> Dict[str, Any]:
         """
         Upload a file to Moodle's draft area
         
+        The multipart body is streamed, so file-like objects are sent in
+        chunks rather than being read into memory first.
+        
         Args:
-            file_data: File content as bytes
+            file_data: File content as bytes or a readable file-like object
             filename: Name of the file
             contextid: Context ID (default 1 for system context)
             component: Component name (default 'user')
@@ -578,23 +692,20 @@ class MoodleService:
         base_path = self.base_url.replace('/webservice/rest/server.php', '')
         upload_url = f"{base_path}/webservice/upload.php"
         
-        files = {
-            'file': (filename, file_data, 'application/octet-stream')
-        }
-        
-        data = {
+        encoder = MultipartEncoder(fields={
             'token': self.token,
             'component': component,
             'filearea': filearea,
-            'itemid': itemid,
-            'contextid': contextid
-        }
+            'itemid': str(itemid),
+            'contextid': str(contextid),
+            'file': (filename, file_data, 'application/octet-stream')
+        })
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 upload_url,
-                files=files,
-                data=data,
+                data=encoder,
+                headers={'Content-Type': encoder.content_type},
                 timeout=self.timeout_seconds
             )
             response.raise_for_status()
@@ -630,6 +741,39 @@ class MoodleService:
         
         return self.call('mod_resource_add_resource', params)
     
+    def attach_file_to_courses(self, courseids: List[int], draftitemid: int, 
+                               name: str, intro: str = '', 
+                               max_concurrency: int = 10) -> List[Dict[str, Any]]:
+        """
+        Attach the same draft file to several courses concurrently
+        
+        Calls run in parallel over the pooled session, so wall time tracks the
+        slowest course rather than the sum of all of them.
+        
+        Args:
+            courseids: Course IDs to attach the file to
+            draftitemid: Draft item ID from upload_file
+            name: Resource name
+            intro: Resource description
+            max_concurrency: Maximum simultaneous Moodle requests
+            
+        Returns:
+            One entry per course: {'courseid', 'ok', 'result'} or {'courseid', 'ok', 'error'}
+        """
+        def attach_one(courseid):
+            try:
+                result = self.attach_file_to_course_resource(courseid, draftitemid, name, intro)
+                return {'courseid': courseid, 'ok': True, 'result': result}
+            except MoodleError as e:
+                return {'courseid': courseid, 'ok': False, 'error': str(e)}
+        
+        if not courseids:
+            return []
+        
+        workers = min(max_concurrency, len(courseids))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='moodle-attach') as executor:
+            return list(executor.map(attach_one, courseids))
+    
     def delete_course(self, course_id: int) -> Dict[str, Any]:
         """
         Delete a course from Moodle
@@ -793,15 +937,18 @@ class MoodleService:
         result = self.call('core_user_get_users', params)
         return result.get('users', []) if isinstance(result, dict) else []
     
-    def upload_file_core(self, file_data: bytes, filename: str, 
+    def upload_file_core(self, file_data: Union[bytes, BinaryIO], filename: str, 
                         contextid: int = 1, component: str = 'user', 
                         filearea: str = 'draft', itemid: int = 0,
                         filepath: str = '/') -> List[Dict[str, Any]]:
         """
         Upload file using core_files_upload web service function
         
+        File-like objects are base64-encoded chunk by chunk while the request
+        body is sent, so neither the file nor its encoding is held in memory.
+        
         Args:
-            file_data: File content as bytes
+            file_data: File content as bytes or a readable file-like object
             filename: Name of the file
             contextid: Context ID (default 1 for system context)
             component: Component name (default 'user')
@@ -812,22 +959,21 @@ class MoodleService:
         Returns:
             List of uploaded file objects
         """
-        import base64
-        
-        # Encode file data as base64 for the web service
-        file_content_b64 = base64.b64encode(file_data).decode('utf-8')
-        
         params = {
             'contextid': contextid,
             'component': component,
             'filearea': filearea,
             'itemid': itemid,
             'filepath': filepath,
-            'filename': filename,
-            'filecontent': file_content_b64
+            'filename': filename
         }
         
-        result = self.call('core_files_upload', params)
+        # Encode file data as base64 for the web service
+        if hasattr(file_data, 'read'):
+            result = self.call('core_files_upload', params, stream=('filecontent', file_data))
+        else:
+            params['filecontent'] = base64.b64encode(file_data).decode('utf-8')
+            result = self.call('core_files_upload', params)
         return result if isinstance(result, list) else []
     
     def search_courses(self, search_term: str, page: int = 0, perpage: int = 20) -> Dict[str, Any]:
@@ -938,4 +1084,19 @@ class MoodleService:
             
         except Exception as e:
             log.warning(f"Failed to get error notifications: {str(e)}")
-            return []
\ No newline at end of file
+            return []
+
+
+# Process-wide service instance, created on first use
+_moodle_service = None
+_moodle_service_lock = threading.Lock()
+
+
+def get_moodle_service() -> MoodleService:
+    """Get the shared Moodle service instance (configured from env vars)"""
+    global _moodle_service
+    if _moodle_service is None:
+        with _moodle_service_lock:
+            if _moodle_service is None:
+                _moodle_service = MoodleService()
+    return _moodle_service
@@ -0,0 +1,80 @@
+import uuid
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from ..models import DBSession
+
+log = logging.getLogger(__name__)
+
+
+class BackgroundTaskQueue:
+    """Runs slow side effects (external LMS calls) off the request thread"""
+
+    def __init__(self, max_workers=4, max_tracked=1000):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='lms-task')
+        self.max_tracked = max_tracked
+        self._tracked = OrderedDict()  # task_id -> Future
+        self._lock = Lock()
+
+    def submit(self, func, *args, **kwargs):
+        """Queue func to run in the background with its own database session"""
+        return self.executor.submit(self._run, func, *args, **kwargs)
+
+    def submit_tracked(self, func, *args, **kwargs):
+        """Queue func like submit() and return a task id for get_status()"""
+        task_id = uuid.uuid4().hex
+        future = self.submit(func, *args, **kwargs)
+        with self._lock:
+            self._tracked[task_id] = future
+            # Forget the oldest finished tasks once the history is full
+            while len(self._tracked) > self.max_tracked:
+                oldest_id, oldest = next(iter(self._tracked.items()))
+                if not oldest.done():
+                    break
+                del self._tracked[oldest_id]
+        return task_id
+
+    def get_status(self, task_id):
+        """Return the state of a tracked task, or None if it is unknown"""
+        with self._lock:
+            future = self._tracked.get(task_id)
+        if future is None:
+            return None
+
+        status = {'task_id': task_id}
+        if not future.done():
+            status['status'] = 'running' if future.running() else 'queued'
+        elif future.exception() is not None:
+            status['status'] = 'failed'
+            status['error'] = str(future.exception())
+        else:
+            status['status'] = 'completed'
+            status['result'] = future.result()
+        return status
+
+    @staticmethod
+    def _run(func, *args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            log.error("Background task %s failed: %s", func.__name__, e)
+            DBSession.rollback()
+            # Keep the error on the future so tracked tasks report it
+            raise
+        finally:
+            # Each worker thread gets its own scoped session; release it per task
+            DBSession.remove()
+
+    def shutdown(self, wait=True):
+        """Stop accepting tasks and optionally wait for queued ones"""
+        self.executor.shutdown(wait=wait)
+
+
+# Global task queue instance
+task_queue = BackgroundTaskQueue()
+
+
+def get_task_queue():
+    """Get the global background task queue"""
+    return task_queue
@@ -1 +1,16 @@
-# Views package
\ No newline at end of file
+# Views package
+from pyramid.httpexceptions import HTTPBadRequest
+
+
+def get_pagination(params, default_limit=20, max_limit=200, first_page=1):
+    """Parse page/limit query params, clamping them to sane bounds
+    
+    Returns (page, limit). Non-integer values raise HTTPBadRequest so a
+    request can't push an unbounded LIMIT into SQL or an upstream API.
+    """
+    try:
+        page = max(first_page, int(params.get('page', first_page)))
+        limit = min(max_limit, max(1, int(params.get('limit', default_limit))))
+    except (TypeError, ValueError):
+        raise HTTPBadRequest('Invalid pagination parameters')
+    return page, limit
@@ -1,13 +1,17 @@
 from pyramid.view import view_config
 from pyramid.httpexceptions import HTTPBadRequest, HTTPNotFound, HTTPForbidden, HTTPRequestEntityTooLarge
-from pyramid.response import FileResponse
-from sqlalchemy import or_, and_
+from pyramid.response import FileIter, Response
+from sqlalchemy import or_, and_, exists, func, cast, Text, update
+from sqlalchemy.orm import load_only, defer, selectinload
 from ..models import DBSession
 from ..models.course import Course
 from ..models.content import CourseContent
+from . import get_pagination
 from ..auth import require_auth
 from ..services.file_service import FileService
-from ..services.lms_integration import LMSIntegrationService
+from ..services.lms_integration import get_lms_integration_service
+from ..services.task_queue import get_task_queue
+from ..services.cache_service import get_response_cache
 from ..exceptions import ErrorHandler, handle_errors, DatabaseTransaction, ValidationError, FileError, ResourceNotFoundError, ContentError
 import logging
 import json
@@ -20,20 +24,94 @@ log = logging.getLogger(__name__)
 # Initialize file service
 file_service = FileService()
 
+# Content-Type overrides by file extension for served files
+SPECIAL_MIME_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.htm': 'text/html; charset=utf-8',
+}
 
+# Headers that are the same on every served file
+FILE_CORS_ORIGIN = os.getenv('CORS_ALLOW_ORIGIN', 'http://jhbnet.ddns.net:46543')
+_FILE_BASE_HEADERS = {
+    'Access-Control-Allow-Origin': FILE_CORS_ORIGIN,
+}
 
-@view_config(route_name='course_content', request_method='GET', renderer='json')
+# Files behind a content id never change (content is soft-deleted, not replaced)
+FILE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+FILE_DOWNLOAD_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+_HTML_SECURITY_HEADERS = {
+    # Allow iframe embedding from same origin
+    'X-Frame-Options': 'SAMEORIGIN',
+    'Content-Security-Policy': "frame-ancestors 'self'",
+}
+
+# Cached course content listings, keyed by course and request params
+CONTENT_CACHE_TTL = 60
+content_cache = get_response_cache()
+
+
+def _content_cache_prefix(course_id):
+    return f"content:{course_id}"
+
+
+def _invalidate_course_content(course_id):
+    """Drop cached content listings for a course after a write"""
+    content_cache.invalidate_prefix(_content_cache_prefix(course_id) + ':')
+
+
+def _course_exists(course_id):
+    """Check whether a course exists without loading the row"""
+    return DBSession.query(exists().where(Course.course_id == course_id)).scalar()
+
+
+def _get_active_content(content_id):
+    """Load an active content item by primary key via the session identity map"""
+    try:
+        content = DBSession.get(CourseContent, int(content_id))
+    except (TypeError, ValueError):
+        return None
+    if content is None or not content.active:
+        return None
+    return content
+
+
+def _include_content_data(request):
+    """Whether list responses should carry the content_data payload"""
+    return request.params.get('include_data', 'true').lower() != 'false'
+
+
+def _content_search_filter(search_query, prefix=False):
+    """Build the text search filter for content queries"""
+    if prefix:
+        # Prefix match on the lowercased title so the plain btree index applies
+        return CourseContent.title_lc.like(f'{search_query.lower()}%')
+    return or_(
+        CourseContent.title.ilike(f'%{search_query}%'),
+        CourseContent.file_name.ilike(f'%{search_query}%'),
+        cast(CourseContent.content_data, Text).ilike(f'%{search_query}%')
+    )
+
+
+@view_config(route_name='course_content', request_method='GET', renderer='orjson')
 @handle_errors
 def get_course_content(request):
     """Get all content for a course"""
     course_id = request.matchdict['course_id']
     
+    cache_key = content_cache.make_key(_content_cache_prefix(course_id), request.params)
+    cached = content_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     # Check if course exists
-    course = DBSession.query(Course).filter_by(course_id=course_id).first()
-    if not course:
+    if not _course_exists(course_id):
         raise ResourceNotFoundError('Course not found', resource_type='course', resource_id=course_id)
     
+    include_data = _include_content_data(request)
     query = DBSession.query(CourseContent).filter_by(course_id=course_id, active=True)
+    if not include_data:
+        # Don't ship the large content_data column when the caller doesn't need it
+        query = query.options(defer(CourseContent.content_data))
     
     # Optional filtering by content type
     content_type = request.params.get('type')
@@ -43,13 +121,9 @@ def get_course_content(request):
     # Search functionality
     search_query = request.params.get('search', '').strip()
     if search_query:
-        # Search in title, file_name, and content_data
-        search_filter = or_(
-            CourseContent.title.ilike(f'%{search_query}%'),
-            CourseContent.file_name.ilike(f'%{search_query}%'),
-            CourseContent.content_data.ilike(f'%{search_query}%')
-        )
-        query = query.filter(search_filter)
+        # Search in title, file_name, and content_data (or title prefix only)
+        prefix = request.params.get('prefix', 'false').lower() == 'true'
+        query = query.filter(_content_search_filter(search_query, prefix))
     
     # Visibility filtering (respect access control)
     visibility_filter = request.params.get('visibility')
@@ -70,26 +144,16 @@ def get_course_content(request):
     else:  # default: upload_date
         query = query.order_by(CourseContent.upload_date.desc())
     
+    # Items with missing files are still listed; serve_content_file reports them on access
     content_items = query.all()
     
-    # Filter out items with missing files (optional cleanup)
-    valid_items = []
-    for item in content_items:
-        if item.content_type == 'file' and item.file_path:
-            if not os.path.exists(item.file_path):
-                log.warning(f"File missing for content ID {item.id}: {item.file_path}")
-                # Optionally mark as inactive or continue showing
-                valid_items.append(item)  # Show anyway, error will be handled on access
-            else:
-                valid_items.append(item)
-        else:
-            valid_items.append(item)
-    
-    return {
-        'content': [item.to_dict() for item in valid_items],
-        'total': len(valid_items),
+    result = {
+        'content': [item.to_dict(include_data=include_data) for item in content_items],
+        'total': len(content_items),
         'course_id': course_id
     }
+    content_cache.set(cache_key, result, ttl=CONTENT_CACHE_TTL)
+    return result
 
 
 @view_config(route_name='upload_content', request_method='POST', renderer='json')
@@ -98,8 +162,10 @@ def upload_content(request):
     """Upload content to a course"""
     course_id = request.matchdict['course_id']
     
-    # Check if course exists
-    course = DBSession.query(Course).filter_by(course_id=course_id).first()
+    # Load the course once; its LMS fields drive the external sync
+    course = DBSession.query(Course).options(
+        load_only(Course.course_id, Course.lms, Course.external_id)
+    ).filter_by(course_id=course_id).first()
     if not course:
         raise ResourceNotFoundError('Course not found', resource_type='course', resource_id=course_id)
     
@@ -110,90 +176,78 @@ def upload_content(request):
         visibility = request.params.get('visibility', 'private')
         access_level = request.params.get('access_level', 'course_members')
         
-        if content_type == 'file':
-            return _handle_file_upload(request, course_id, title, visibility, access_level)
-        elif content_type == 'url':
-            return _handle_url_upload(request, course_id, title, visibility, access_level)
-        elif content_type == 'text':
-            return _handle_text_upload(request, course_id, title, visibility, access_level)
-        else:
+        build_payload = _UPLOAD_PAYLOAD_BUILDERS.get(content_type)
+        if build_payload is None:
             raise ValidationError('Invalid content type', field='content_type', value=content_type)
+        
+        payload, file_path, label = build_payload(request, course_id, title)
+        payload.update({
+            'course_id': course_id,
+            'content_type': content_type,
+            'visibility': visibility,
+            'access_level': access_level
+        })
+        content_data = _persist_content(payload)
+        result = content_data.to_dict()
+    
+    _invalidate_course_content(course_id)
+    
+    # Mirror to the external LMS only after the commit, so a slow LMS never
+    # holds the write transaction open
+    if course.lms in _LMS_UPLOADERS and course.external_id:
+        get_task_queue().submit(_upload_external_content, content_data.id, course.lms, file_path, label)
+    
+    log.info("%s uploaded successfully to course %s", label, course_id)
+    return result
 
 
-def _handle_file_upload(request, course_id, title, visibility='private', access_level='course_members'):
-    """Handle file upload"""
+def _build_file_payload(request, course_id, title):
+    """Validate and save an uploaded file, returning its content payload"""
     # Get uploaded file
     if 'file' not in request.POST:
         raise ValidationError('No file provided', field='file')
     
     file_field = request.POST['file']
     
-    # Read file data
     if hasattr(file_field, 'file'):
-        file_data = file_field.file.read()
+        file_obj = file_field.file
         filename = getattr(file_field, 'filename', 'unknown')
     else:
         raise ValidationError('Invalid file format', field='file')
     
-    # Validate file
-    file_size = len(file_data)
-    try:
-        file_service.validate_file(filename, file_size)
-    except (ValidationError, FileError) as e:
-        raise e  # Re-raise validation/file errors as-is
+    # Validate the name up front; save_file enforces size while copying
+    file_service.validate_filename(filename)
     
-    # Save file
-    try:
-        success, result, file_info = file_service.save_file(file_data, filename, course_id)
-        if not success:
-            raise FileError(result, operation='save_file', file_path=filename)
-    except FileError as e:
-        raise e  # Re-raise FileError as-is
-    
-    # Create content record
-    content_data = CourseContent.from_dict({
-        'course_id': course_id,
+    # Stream to disk, reusing an identical existing upload when there is one
+    success, result, file_info = file_service.save_file(
+        file_obj, filename, course_id, find_duplicate=_find_duplicate_file
+    )
+    if not success:
+        raise FileError(result, operation='save_file', file_path=filename)
+    
+    payload = {
         'title': title or filename,
-        'content_type': 'file',
         'file_path': file_info['file_path'],
         'file_name': file_info['file_name'],
         'file_size': file_info['file_size'],
         'mime_type': file_info['mime_type'],
-        'visibility': visibility,
-        'access_level': access_level
-    }, 1)
-    
-    DBSession.add(content_data)
-    DBSession.commit()
-    
-    # Try to upload to external LMS if course is from external LMS
-    course = DBSession.query(Course).filter_by(course_id=course_id).first()
-    if course and course.lms != 'local' and course.external_id:
-        try:
-            from ..services.lms_integration import LMSIntegrationService
-            integration_service = LMSIntegrationService()
-            
-            if course.lms == 'moodle':
-                external_id = integration_service.upload_to_moodle(content_data, file_info['file_path'])
-            elif course.lms == 'canvas':
-                external_id = integration_service.upload_to_canvas(content_data, file_info['file_path'])
-            
-            if external_id:
-                content_data.lms_resource_id = str(external_id)
-                DBSession.commit()
-                log.info(f"File also uploaded to external LMS ({course.lms}) with ID: {external_id}")
-                
-        except Exception as ext_error:
-            log.warning(f"Failed to upload file to external LMS ({course.lms}): {str(ext_error)}")
-            # Continue with local upload even if external upload fails
-    
-    log.info(f"File uploaded successfully: {filename} to course {course_id}")
-    
-    return content_data.to_dict()
+        'sha256': file_info['sha256']
+    }
+    return payload, file_info['file_path'], f'File {filename}'
+
 
+def _find_duplicate_file(sha256):
+    """Path of an active stored file with the given content hash, if any"""
+    row = DBSession.query(CourseContent.file_path).filter(
+        CourseContent.sha256 == sha256,
+        CourseContent.active == True,
+        CourseContent.file_path.isnot(None)
+    ).limit(1).first()
+    return row.file_path if row else None
 
-def _handle_url_upload(request, course_id, title, visibility='private', access_level='course_members'):
-    """Handle URL upload"""
+
+def _build_url_payload(request, course_id, title):
+    """Validate a submitted URL, returning its content payload"""
     url = request.params.get('url', '').strip()
     description = request.params.get('description', '')
     
@@ -202,47 +256,16 @@ def _handle_url_upload(request, course_id, title, visibility='private', access_l
     if not is_valid:
         raise HTTPBadRequest(error_msg)
     
-    # Create content record
-    content_data = CourseContent.from_dict({
-        'course_id': course_id,
-        'title': title or f'Link: {url[:50]}...' if len(url) > 50 else f'Link: {url}',
-        'content_type': 'url',
-        'content_data': {'url': url, 'description': description},
-        'visibility': visibility,
-        'access_level': access_level
-    }, 1)
-    
-    DBSession.add(content_data)
-    DBSession.commit()
-    
-    # Try to upload to external LMS if course is from external LMS
-    course = DBSession.query(Course).filter_by(course_id=course_id).first()
-    if course and course.lms != 'local' and course.external_id:
-        try:
-            from ..services.lms_integration import LMSIntegrationService
-            integration_service = LMSIntegrationService()
-            
-            if course.lms == 'moodle':
-                external_id = integration_service.upload_to_moodle(content_data)
-            elif course.lms == 'canvas':
-                external_id = integration_service.upload_to_canvas(content_data)
-            
-            if external_id:
-                content_data.lms_resource_id = str(external_id)
-                DBSession.commit()
-                log.info(f"URL also uploaded to external LMS ({course.lms}) with ID: {external_id}")
-                
-        except Exception as ext_error:
-            log.warning(f"Failed to upload URL to external LMS ({course.lms}): {str(ext_error)}")
-            # Continue with local upload even if external upload fails
-    
-    log.info(f"URL uploaded successfully: {url} to course {course_id}")
-    
-    return content_data.to_dict()
+    truncated = url if len(url) <= 50 else url[:50] + '...'
+    payload = {
+        'title': title or f'Link: {truncated}',
+        'content_data': {'url': url, 'description': description}
+    }
+    return payload, None, f'URL {url}'
 
 
-def _handle_text_upload(request, course_id, title, visibility='private', access_level='course_members'):
-    """Handle text content upload"""
+def _build_text_payload(request, course_id, title):
+    """Validate submitted text, returning its content payload"""
     text_content = request.params.get('text_content', '').strip()
     
     # Validate text content
@@ -250,43 +273,61 @@ def _handle_text_upload(request, course_id, title, visibility='private', access_
     if not is_valid:
         raise HTTPBadRequest(error_msg)
     
-    # Create content record
-    content_data = CourseContent.from_dict({
-        'course_id': course_id,
-        'title': title or f'Text: {text_content[:50]}...' if len(text_content) > 50 else 'Text Content',
-        'content_type': 'text',
-        'content_data': {'text': text_content},
-        'visibility': visibility,
-        'access_level': access_level
-    }, 1)
+    payload = {
+        'title': title or (f'Text: {text_content[:50]}...' if len(text_content) > 50 else 'Text Content'),
+        'content_data': {'text': text_content}
+    }
+    return payload, None, 'Text content'
+
+
+_UPLOAD_PAYLOAD_BUILDERS = {
+    'file': _build_file_payload,
+    'url': _build_url_payload,
+    'text': _build_text_payload,
+}
+
+# External LMS upload methods on LMSIntegrationService, by course LMS type
+_LMS_UPLOADERS = {
+    'moodle': 'upload_to_moodle',
+    'canvas': 'upload_to_canvas',
+}
+
+
+def _persist_content(payload):
+    """Store a content record
+    
+    Runs inside the caller's DatabaseTransaction, which issues the single commit.
+    """
+    content_data = CourseContent.from_dict(payload, 1)
     
+    # Flush to get the primary key for the response and the external sync
     DBSession.add(content_data)
-    DBSession.commit()
-    
-    # Try to upload to external LMS if course is from external LMS
-    course = DBSession.query(Course).filter_by(course_id=course_id).first()
-    if course and course.lms != 'local' and course.external_id:
-        try:
-            from ..services.lms_integration import LMSIntegrationService
-            integration_service = LMSIntegrationService()
-            
-            if course.lms == 'moodle':
-                external_id = integration_service.upload_to_moodle(content_data)
-            elif course.lms == 'canvas':
-                external_id = integration_service.upload_to_canvas(content_data)
-            
-            if external_id:
-                content_data.lms_resource_id = str(external_id)
-                DBSession.commit()
-                log.info(f"Text content also uploaded to external LMS ({course.lms}) with ID: {external_id}")
-                
-        except Exception as ext_error:
-            log.warning(f"Failed to upload text content to external LMS ({course.lms}): {str(ext_error)}")
-            # Continue with local upload even if external upload fails
+    DBSession.flush()
     
-    log.info(f"Text content uploaded successfully to course {course_id}")
+    return content_data
+
+
+def _upload_external_content(content_pk, lms_type, file_path, label):
+    """Background task: upload content to the external LMS and store its resource ID"""
+    content_data = DBSession.get(CourseContent, content_pk)
+    if not content_data:
+        return
     
-    return content_data.to_dict()
+    try:
+        integration_service = get_lms_integration_service()
+        external_id = getattr(integration_service, _LMS_UPLOADERS[lms_type])(content_data, file_path)
+    except Exception as ext_error:
+        # The local upload stands even if the external upload fails
+        log.warning("Failed to upload %s to external LMS (%s): %s", label, lms_type, ext_error)
+        return
+    
+    if external_id:
+        DBSession.query(CourseContent).filter(CourseContent.id == content_pk).update(
+            {CourseContent.lms_resource_id: str(external_id)}, synchronize_session=False
+        )
+        DBSession.commit()
+        _invalidate_course_content(content_data.course_id)
+        log.info("%s also uploaded to external LMS (%s) with ID: %s", label, lms_type, external_id)
 
 
 @view_config(route_name='content_item', request_method='GET', renderer='json')
@@ -294,7 +335,7 @@ def get_content_item(request):
     """Get a specific content item"""
     content_id = request.matchdict['content_id']
     
-    content = DBSession.query(CourseContent).filter_by(id=content_id, active=True).first()
+    content = _get_active_content(content_id)
     if not content:
         raise HTTPNotFound('Content not found')
     
@@ -306,7 +347,7 @@ def update_content_item(request):
     """Update a content item"""
     content_id = request.matchdict['content_id']
     
-    content = DBSession.query(CourseContent).filter_by(id=content_id, active=True).first()
+    content = _get_active_content(content_id)
     if not content:
         raise HTTPNotFound('Content not found')
     
@@ -337,17 +378,18 @@ def update_content_item(request):
                     if not is_valid:
                         raise HTTPBadRequest(error_msg)
             
-            content.content_data = json.dumps(data['content_data'])
+            content.content_data = data['content_data']
         
         DBSession.commit()
+        _invalidate_course_content(content.course_id)
         
-        log.info(f"Content updated: {content_id}")
+        log.info("Content updated: %s", content_id)
         
         return content.to_dict()
         
     except Exception as e:
         DBSession.rollback()
-        log.error(f"Error updating content: {str(e)}")
+        log.error("Error updating content: %s", e)
         raise HTTPBadRequest(f'Update failed: {str(e)}')
 
 
@@ -355,38 +397,106 @@ def update_content_item(request):
 def delete_content_item(request):
     """Delete a content item"""
     content_id = request.matchdict['content_id']
-    
-    content = DBSession.query(CourseContent).filter_by(id=content_id, active=True).first()
-    if not content:
+    try:
+        content_pk = int(content_id)
+    except ValueError:
         raise HTTPNotFound('Content not found')
     
     # Skip user permission check - using configured token approach
     
     try:
-        # Delete file from disk if it exists
-        if content.file_path and os.path.exists(content.file_path):
-            file_service.delete_file(content.file_path)
+        # Mark as inactive (soft delete) with a single UPDATE, getting back what we
+        # need for cleanup instead of loading the ORM object first
+        stmt = update(CourseContent).where(
+            CourseContent.id == content_pk,
+            CourseContent.active == True
+        ).values(active=False)
+        
+        if DBSession.get_bind().dialect.update_returning:
+            row = DBSession.execute(
+                stmt.returning(CourseContent.course_id, CourseContent.file_path)
+            ).first()
+        else:
+            row = DBSession.query(CourseContent.course_id, CourseContent.file_path).filter(
+                CourseContent.id == content_pk,
+                CourseContent.active == True
+            ).first()
+            if row:
+                DBSession.execute(stmt)
         
-        # Mark as inactive (soft delete)
-        content.active = False
+        if not row:
+            raise HTTPNotFound('Content not found')
         DBSession.commit()
+        _invalidate_course_content(row.course_id)
+        
+        # Delete file from disk if it exists
+        if row.file_path:
+            file_service.delete_file(row.file_path)
         
-        log.info(f"Content deleted: {content_id}")
+        log.info("Content deleted: %s", content_id)
         
         return {'message': 'Content deleted successfully'}
         
+    except HTTPNotFound:
+        DBSession.rollback()
+        raise
     except Exception as e:
         DBSession.rollback()
-        log.error(f"Error deleting content: {str(e)}")
+        log.error("Error deleting content: %s", e)
         raise HTTPBadRequest(f'Delete failed: {str(e)}')
 
 
+# Block size used when the WSGI server copies a served file
+FILE_BLOCK_SIZE = 1024 * 1024
+
+
+def _attach_file_stream(request, response, file_path, file_size):
+    """Stream a file through the server's wsgi.file_wrapper (sendfile where supported)
+    
+    Opens the file, so call it last, once nothing else can fail and leak the handle.
+    """
+    f = open(file_path, 'rb')
+    try:
+        file_wrapper = request.environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            response.app_iter = file_wrapper(f, FILE_BLOCK_SIZE)
+        else:
+            response.app_iter = FileIter(f, FILE_BLOCK_SIZE)
+    except Exception:
+        f.close()
+        raise
+    # Assigning app_iter clears Content-Length, so set it afterwards
+    response.content_length = file_size
+
+
+def _offloaded_file_response(request, file_path, content_type):
+    """Hand the file off to the reverse proxy when X-Sendfile/X-Accel-Redirect is enabled"""
+    mode = request.registry.settings.get('lms.xsendfile', 'off').strip().lower()
+    if mode not in ('nginx', 'apache'):
+        return None
+    
+    if mode == 'apache':
+        response = Response(content_type=content_type)
+        response.headers['X-Sendfile'] = file_path
+        return response
+    
+    # nginx maps an internal location onto the upload directory
+    upload_dir = file_service.upload_dir
+    if os.path.commonpath([upload_dir, file_path]) != upload_dir:
+        return None
+    prefix = request.registry.settings.get('lms.xsendfile_prefix', '/internal/uploads/')
+    relpath = os.path.relpath(file_path, upload_dir).replace(os.sep, '/')
+    response = Response(content_type=content_type)
+    response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + relpath
+    return response
+
+
 @view_config(route_name='content_file', request_method='GET')
 def serve_content_file(request):
     """Serve a content file"""
     content_id = request.matchdict['content_id']
     
-    content = DBSession.query(CourseContent).filter_by(id=content_id, active=True).first()
+    content = _get_active_content(content_id)
     if not content:
         raise HTTPNotFound('Content not found')
     
@@ -399,20 +509,22 @@ def serve_content_file(request):
         # If relative path, make it absolute from current working directory
         file_path = os.path.abspath(file_path)
     
-    log.info(f"Content ID: {content_id}, File: {content.file_name}")
-    log.info(f"Database file path: {content.file_path}")
-    log.info(f"Resolved file path: {file_path}")
+    log.debug("Content ID: %s, File: %s", content_id, content.file_name)
+    log.debug("Database file path: %s, resolved file path: %s", content.file_path, file_path)
     
-    if not os.path.exists(file_path):
-        log.error(f"File not found on disk: {file_path}")
-        log.error(f"Current working directory: {os.getcwd()}")
+    try:
+        file_stat = os.stat(file_path)
+    except FileNotFoundError:
+        log.error("File not found on disk: %s", file_path)
         
-        # Check if directory exists
-        file_dir = os.path.dirname(file_path)
-        if os.path.exists(file_dir):
-            log.error(f"Directory exists but file missing. Files in directory: {os.listdir(file_dir)}")
-        else:
-            log.error(f"Directory does not exist: {file_dir}")
+        # Directory diagnostics cost extra syscalls, only pay for them when debugging
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Current working directory: %s", os.getcwd())
+            file_dir = os.path.dirname(file_path)
+            if os.path.isdir(file_dir):
+                log.debug("Directory exists but file missing. Files in directory: %s", os.listdir(file_dir))
+            else:
+                log.debug("Directory does not exist: %s", file_dir)
             
         raise HTTPNotFound(f'File not found on disk: {os.path.basename(file_path)}')
     
@@ -420,56 +532,53 @@ def serve_content_file(request):
     download = request.params.get('download', '').lower() == 'true'
     
     try:
-        # Determine content type - fix HTML files
-        content_type = content.mime_type or 'application/octet-stream'
+        # Determine content type, applying extension overrides (e.g. HTML charset)
+        ext = os.path.splitext(content.file_name or '')[1].lower()
+        content_type = SPECIAL_MIME_TYPES.get(ext) or content.mime_type or 'application/octet-stream'
         
-        # Special handling for HTML files
-        if content.file_name and content.file_name.lower().endswith('.html'):
-            content_type = 'text/html; charset=utf-8'
+        # Let the proxy stream the file when configured, otherwise stream it ourselves
+        response = _offloaded_file_response(request, file_path, content_type)
+        offloaded = response is not None
+        if not offloaded:
+            response = Response(content_type=content_type)
         
-        # Return file response
-        response = FileResponse(
-            file_path,
-            request=request,
-            content_type=content_type
-        )
-        
-        # Set appropriate headers based on request type
-        if download:
-            # Force download
+        # Set appropriate headers based on request type (force download or display inline)
+        if download or content.file_name:
             safe_filename = content.file_name.replace('"', '\\"') if content.file_name else 'download'
-            response.headers['Content-Disposition'] = f'attachment; filename="{safe_filename}"'
-        else:
-            # Display inline
-            if content.file_name:
-                safe_filename = content.file_name.replace('"', '\\"')
-                response.headers['Content-Disposition'] = f'inline; filename="{safe_filename}"'
+            disposition = 'attachment' if download else 'inline'
+            response.headers['Content-Disposition'] = f'{disposition}; filename="{safe_filename}"'
         
-        # Add content length
-        file_size = os.path.getsize(file_path)
-        response.headers['Content-Length'] = str(file_size)
+        # Add validators (the proxy handles offloaded responses)
+        file_size = file_stat.st_size
+        if not offloaded:
+            response.etag = content.sha256 or (
+                f"{file_stat.st_ino:x}-{int(file_stat.st_mtime):x}-{file_size:x}"
+            )
+            response.last_modified = file_stat.st_mtime
+            # Lets WebOb answer If-None-Match/If-Modified-Since with 304 and serve Range requests
+            response.conditional_response = True
         
         # Add security headers for HTML files
         if content_type.startswith('text/html'):
-            # Allow iframe embedding from same origin
-            response.headers['X-Frame-Options'] = 'SAMEORIGIN'
-            response.headers['Content-Security-Policy'] = "frame-ancestors 'self'"
+            response.headers.update(_HTML_SECURITY_HEADERS)
+        
+        # Ensure proper CORS and caching headers are set
+        response.headers.update(_FILE_BASE_HEADERS)
+        response.headers['Cache-Control'] = FILE_DOWNLOAD_CACHE_CONTROL if download else FILE_CACHE_CONTROL
         
-        # Ensure proper CORS headers are set
-        cors_origin = os.getenv('CORS_ALLOW_ORIGIN', 'http://jhbnet.ddns.net:46543')
-        response.headers['Access-Control-Allow-Origin'] = cors_origin
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+        # Open the file only after every header is in place
+        if not offloaded:
+            _attach_file_stream(request, response, file_path, file_size)
         
-        log.info(f"File served successfully: {content.file_name} ({file_size} bytes) - Content-Type: {content_type}")
+        log.info("File served successfully: %s (%s bytes) - Content-Type: %s", content.file_name, file_size, content_type)
         return response
         
     except Exception as e:
-        log.error(f"Error serving file {file_path}: {str(e)}")
-        log.exception("Full exception details:")
+        log.error("Error serving file %s: %s", file_path, e)
         raise HTTPNotFound('Error serving file')
 
 
-@view_config(route_name='search_content', request_method='GET', renderer='json')
+@view_config(route_name='search_content', request_method='GET', renderer='orjson')
 def search_content(request):
     """Search content across all courses"""
     search_query = request.params.get('q', '').strip()
@@ -482,24 +591,23 @@ def search_content(request):
     access_level_filter = request.params.get('access_level')
     
     # Pagination
-    try:
-        page = int(request.params.get('page', 1))
-        limit = min(int(request.params.get('limit', 20)), 100)  # Max 100 results per page
-    except ValueError:
-        page, limit = 1, 20
+    page, limit = get_pagination(request.params, max_limit=100)  # Max 100 results per page
     
     offset = (page - 1) * limit
     
     # Base query - only active content
-    query = DBSession.query(CourseContent).filter(CourseContent.active == True)
-    
-    # Search in title, file_name, and content_data
-    search_filter = or_(
-        CourseContent.title.ilike(f'%{search_query}%'),
-        CourseContent.file_name.ilike(f'%{search_query}%'),
-        CourseContent.content_data.ilike(f'%{search_query}%')
+    include_data = _include_content_data(request)
+    query = DBSession.query(CourseContent).filter(CourseContent.active == True).options(
+        # Batch-load the course name/LMS for all results in one SELECT ... IN
+        selectinload(CourseContent.course).load_only(Course.course_id, Course.name, Course.lms)
     )
-    query = query.filter(search_filter)
+    if not include_data:
+        # content_data is still matched in SQL, just never loaded into Python
+        query = query.options(defer(CourseContent.content_data))
+    
+    # Search in title, file_name, and content_data (or title prefix only)
+    prefix = request.params.get('prefix', 'false').lower() == 'true'
+    query = query.filter(_content_search_filter(search_query, prefix))
     
     # Apply filters
     if content_type:
@@ -518,9 +626,6 @@ def search_content(request):
     # For now, show all content user has course access to
     # This could be enhanced with more granular permissions
     
-    # Get total count for pagination
-    total_count = query.count()
-    
     # Apply sorting and pagination
     sort_by = request.params.get('sort', 'upload_date')
     if sort_by == 'title':
@@ -536,16 +641,30 @@ def search_content(request):
     else:  # default: upload_date
         query = query.order_by(CourseContent.upload_date.desc())
     
-    # Apply pagination
-    content_items = query.offset(offset).limit(limit).all()
+    # Apply pagination. Totals are opt-in (count=true) since counting the
+    # whole ILIKE-filtered set is expensive; otherwise peek one row ahead.
+    with_count = request.params.get('count', 'false').lower() == 'true'
+    if with_count:
+        rows = query.add_columns(func.count().over().label('total')).offset(offset).limit(limit).all()
+        if rows:
+            total_count = rows[0].total
+        else:
+            # Past the last page the window count has no row to ride on
+            total_count = query.count() if offset else 0
+        content_items = [row[0] for row in rows]
+    else:
+        content_items = query.offset(offset).limit(limit + 1).all()
+        total_count = None
+        has_next = len(content_items) > limit
+        content_items = content_items[:limit]
     
     # Prepare results with course information
     results = []
     for item in content_items:
-        item_dict = item.to_dict()
+        item_dict = item.to_dict(include_data=include_data)
         
         # Add course information
-        course = DBSession.query(Course).filter_by(course_id=item.course_id).first()
+        course = item.course
         if course:
             item_dict['course_name'] = course.name
             item_dict['course_lms'] = course.lms
@@ -553,8 +672,10 @@ def search_content(request):
         results.append(item_dict)
     
     # Calculate pagination info
-    total_pages = (total_count + limit - 1) // limit
-    has_next = page < total_pages
+    total_pages = None
+    if with_count:
+        total_pages = (total_count + limit - 1) // limit
+        has_next = page < total_pages
     has_prev = page > 1
     
     return {
@@ -1,37 +1,116 @@
 from pyramid.view import view_config
 from pyramid.httpexceptions import HTTPBadRequest, HTTPNotFound, HTTPForbidden
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, func, text
+from sqlalchemy.exc import IntegrityError
 from ..models import DBSession
-from ..models.course import Course
+from ..models.course import Course, COURSE_SEARCH_DOCUMENT
+from ..models.content import CourseContent
+from . import get_pagination
 from ..auth import require_auth
-from ..services.lms_integration import LMSIntegrationService
+from ..services.lms_integration import get_lms_integration_service
+from ..services.task_queue import get_task_queue
+from ..services.cache_service import get_response_cache
 from ..exceptions import ErrorHandler, handle_errors, DatabaseTransaction, ValidationError, ResourceNotFoundError, LMSIntegrationError
 import logging
 import os
+import re
 
 log = logging.getLogger(__name__)
 
+# Filtered course totals, cached across page navigation
+COURSE_COUNT_TTL = 60
+COURSE_COUNT_PREFIX = 'courses:count'
+course_count_cache = get_response_cache()
+
+
+def _invalidate_course_counts():
+    """Drop cached course totals after courses change"""
+    course_count_cache.invalidate_prefix(COURSE_COUNT_PREFIX + ':')
+
+
+# LMSIntegrationService method names by LMS type
+_SYNC_METHODS = {
+    'moodle': 'sync_moodle_courses',
+    'canvas': 'sync_canvas_courses',
+    'sakai': 'sync_sakai_courses',
+    'chamilo': 'sync_chamilo_courses',
+}
+_CREATE_METHODS = {
+    'moodle': 'create_moodle_course',
+    'canvas': 'create_canvas_course',
+    'sakai': 'create_sakai_course',
+    'chamilo': 'create_chamilo_course',
+}
+_UPDATE_METHODS = {
+    'moodle': 'update_moodle_course',
+    'canvas': 'update_canvas_course',
+    'sakai': 'update_sakai_course',
+    'chamilo': 'update_chamilo_course',
+}
+
+# Request body fields, kept as module constants rather than rebuilt per request
+_COURSE_REQUIRED = ('course_id', 'name', 'short_name')
+_COURSE_UPDATEABLE = ('name', 'short_name', 'description', 'category', 'lms', 'active', 'visibility', 'access_level')
+
 
 # OPTIONS handler removed - now handled by global OPTIONS handler in __init__.py
 
 
 
-@view_config(route_name='courses', request_method='GET', renderer='json')
+# ?search_mode= values for get_courses
+_SEARCH_MODES = ('substring', 'words')
+
+
+def _course_search_filter(search, mode='substring'):
+    """
+    Build the course search filter
+    
+    'substring' (the default) matches the term anywhere in the name, short
+    name or description, case-insensitively: 'ology' finds 'Biology'.
+    
+    'words' matches every search word as a word prefix through the
+    ix_courses_search full-text GIN index on PostgreSQL: 'bio chem' finds
+    'Chemistry for Biologists', but 'ology' does not find 'Biology'. On other
+    databases it falls back to the substring match.
+    """
+    terms = re.findall(r'\w+', search)
+    use_fts = (
+        mode == 'words'
+        and terms
+        and '%' not in search and '_' not in search
+        and DBSession.get_bind().dialect.name == 'postgresql'
+    )
+    if use_fts:
+        # Prefix-match every word so partial words still find courses
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return text(
+            f"{COURSE_SEARCH_DOCUMENT} @@ to_tsquery('simple', :course_tsquery)"
+        ).bindparams(course_tsquery=tsquery)
+    
+    # Substring match; on PostgreSQL the pg_trgm GIN indexes
+    # (add_course_trgm_indexes) let these '%term%' filters use an index
+    return or_(
+        Course.name.ilike(f'%{search}%'),
+        Course.short_name.ilike(f'%{search}%'),
+        Course.description.ilike(f'%{search}%')
+    )
+
+
+@view_config(route_name='courses', request_method='GET', renderer='orjson')
 @handle_errors
 def get_courses(request):
     """Get all courses with optional filtering"""
-    query = DBSession.query(Course)
+    # Plain column rows: no ORM identity-map/attribute overhead for a read-only listing
+    query = DBSession.query(*Course.__table__.columns)
     
     # Search functionality
     search = request.params.get('search')
+    search_mode = request.params.get('search_mode', 'substring')
+    if search_mode not in _SEARCH_MODES:
+        raise ValidationError(f"search_mode must be one of: {', '.join(_SEARCH_MODES)}",
+                              field='search_mode', value=search_mode)
     if search:
-        query = query.filter(
-            or_(
-                Course.name.ilike(f'%{search}%'),
-                Course.short_name.ilike(f'%{search}%'),
-                Course.description.ilike(f'%{search}%')
-            )
-        )
+        query = query.filter(_course_search_filter(search, search_mode))
     
     # Category filter
     category = request.params.get('category')
@@ -48,21 +127,50 @@ def get_courses(request):
     if active is not None:
         query = query.filter(Course.active == (active.lower() == 'true'))
     
-    # Pagination
-    page = int(request.params.get('page', 1))
-    limit = int(request.params.get('limit', 20))
+    # Pagination (keyset via ?after=<id> when given, otherwise OFFSET)
+    page, limit = get_pagination(request.params)
     offset = (page - 1) * limit
+    after = request.params.get('after')
+    query = query.order_by(Course.id)
+    
+    # Totals only depend on the filters, so reuse them while paging
+    count_key = course_count_cache.make_key(COURSE_COUNT_PREFIX, {
+        'search': search, 'search_mode': search_mode,
+        'category': category, 'lms': lms, 'active': active
+    })
+    total = course_count_cache.get(count_key)
     
-    total = query.count()
-    courses = query.offset(offset).limit(limit).all()
+    if after:
+        try:
+            after_id = int(after)
+        except ValueError:
+            raise ValidationError('after must be a course id', field='after', value=after)
+        if total is None:
+            total = query.order_by(None).count()
+            course_count_cache.set(count_key, total, ttl=COURSE_COUNT_TTL)
+        rows = query.filter(Course.id > after_id).limit(limit).all()
+    elif total is not None:
+        rows = query.offset(offset).limit(limit).all()
+    else:
+        # Fetch the page and the filtered total in one query
+        rows = query.add_columns(func.count().over().label('_total')).offset(offset).limit(limit).all()
+        if rows:
+            total = rows[0]._total
+        else:
+            # Past the last page the window count has no row to ride on
+            total = query.count() if offset else 0
+        course_count_cache.set(count_key, total, ttl=COURSE_COUNT_TTL)
     
+    # The compiled serializer only does attribute access, so it works on rows too
+    serialize = Course.to_dict_fast()
     return {
-        'courses': [course.to_dict() for course in courses],
+        'courses': [serialize(row) for row in rows],
         'pagination': {
             'page': page,
             'limit': limit,
             'total': total,
-            'pages': (total + limit - 1) // limit
+            'pages': (total + limit - 1) // limit,
+            'next_cursor': rows[-1].id if len(rows) == limit else None
         }
     }
 
@@ -76,43 +184,37 @@ def create_course(request):
         raise HTTPBadRequest('Invalid JSON')
     
     # Validation
-    required_fields = ['course_id', 'name', 'short_name']
-    for field in required_fields:
+    for field in _COURSE_REQUIRED:
         if not data.get(field):
             raise HTTPBadRequest(f'{field} is required')
     
-    # Check if course_id already exists
-    existing = DBSession.query(Course).filter_by(course_id=data['course_id']).first()
+    # Check if course_id already exists (id only, no row hydration)
+    existing = DBSession.query(Course.id).filter_by(course_id=data['course_id']).first()
     if existing:
         raise HTTPBadRequest('Course ID already exists')
     
     try:
         course = Course.from_dict(data)
         
-        # If course specifies an LMS, try to create it in the external system
-        lms_type = data.get('lms', 'local')
-        external_id = None
-        
-        if lms_type != 'local':
-            try:
-                integration_service = LMSIntegrationService()
-                external_id = _create_course_in_external_lms(integration_service, lms_type, data)
-                if external_id:
-                    course.external_id = str(external_id)
-                    log.info(f"Course created in external LMS ({lms_type}) with ID: {external_id}")
-            except Exception as ext_error:
-                log.warning(f"Failed to create course in external LMS ({lms_type}): {str(ext_error)}")
-                # Continue with local creation even if external creation fails
-        
         DBSession.add(course)
         DBSession.commit()
+        _invalidate_course_counts()
         
-        log.info(f"Course created: {course.course_id}")
+        log.info("Course created: %s", course.course_id)
+        
+        # If course specifies an LMS, create it in the external system in the background
+        lms_type = data.get('lms', 'local')
+        if lms_type != 'local':
+            get_task_queue().submit(_create_and_patch_external_course, course.id, lms_type, dict(data))
         
         return course.to_dict()
+    except IntegrityError:
+        # Lost the race with a concurrent insert; the unique constraint caught it
+        DBSession.rollback()
+        raise HTTPBadRequest('Course ID already exists')
     except Exception as e:
         DBSession.rollback()
-        log.error(f"Error creating course: {str(e)}")
+        log.error("Error creating course: %s", e)
         raise HTTPBadRequest(f'Error creating course: {str(e)}')
 
 
@@ -144,29 +246,23 @@ def update_course(request):
     
     try:
         # Update fields
-        updateable_fields = ['name', 'short_name', 'description', 'category', 'lms', 'active', 'visibility', 'access_level']
-        for field in updateable_fields:
+        for field in _COURSE_UPDATEABLE:
             if field in data:
                 setattr(course, field, data[field])
         
-        # Try to update in external LMS if it has an external_id
-        if course.external_id:
-            try:
-                integration_service = LMSIntegrationService()
-                _update_course_in_external_lms(integration_service, course, data)
-                log.info(f"Course updated in external LMS ({course.lms}) with ID: {course.external_id}")
-            except Exception as ext_error:
-                log.warning(f"Failed to update course in external LMS ({course.lms}): {str(ext_error)}")
-                # Continue with local update even if external update fails
-        
         DBSession.commit()
+        _invalidate_course_counts()
+        
+        log.info("Course updated: %s", course.course_id)
         
-        log.info(f"Course updated: {course.course_id}")
+        # Update in external LMS in the background if it has an external_id
+        if course.external_id:
+            get_task_queue().submit(_update_external_course, course.id, dict(data))
         
         return course.to_dict()
     except Exception as e:
         DBSession.rollback()
-        log.error(f"Error updating course: {str(e)}")
+        log.error("Error updating course: %s", e)
         raise HTTPBadRequest(f'Error updating course: {str(e)}')
 
 
@@ -175,21 +271,31 @@ def delete_course(request):
     """Delete a course"""
     course_id = request.matchdict['course_id']
     
-    course = DBSession.query(Course).filter_by(course_id=course_id).first()
-    if not course:
-        raise HTTPNotFound('Course not found')
-    
     try:
-        DBSession.delete(course)
-        DBSession.commit()
-        
-        log.info(f"Course deleted: {course_id}")
-        
-        return {'message': 'Course deleted successfully'}
+        # SQLite doesn't enforce the course_content foreign key, so check for
+        # dependent rows (active or not) before the bulk DELETE rather than
+        # leave them orphaned
+        has_content = DBSession.query(
+            DBSession.query(CourseContent.id).filter(CourseContent.course_id == course_id).exists()
+        ).scalar()
+        deleted = 0
+        if not has_content:
+            deleted = DBSession.query(Course).filter_by(course_id=course_id).delete(synchronize_session=False)
+            DBSession.commit()
     except Exception as e:
         DBSession.rollback()
-        log.error(f"Error deleting course: {str(e)}")
+        log.error("Error deleting course: %s", e)
         raise HTTPBadRequest(f'Error deleting course: {str(e)}')
+    
+    if has_content:
+        raise HTTPBadRequest('Cannot delete a course that has content')
+    if not deleted:
+        raise HTTPNotFound('Course not found')
+    
+    _invalidate_course_counts()
+    log.info("Course deleted: %s", course_id)
+    
+    return {'message': 'Course deleted successfully'}
 
 
 @view_config(route_name='sync_courses', request_method='POST', renderer='json')
@@ -203,41 +309,73 @@ def sync_courses(request):
         data = {}
     
     lms_type = data.get('lms_type', 'moodle')  # default to moodle
+    if lms_type not in _SYNC_METHODS:
+        raise HTTPBadRequest('Unsupported LMS type')
+    
+    # The sync makes many external LMS calls; run it off the request thread
+    task_id = get_task_queue().submit_tracked(_sync_courses_task, lms_type)
+    log.info("Course sync queued for %s (task %s)", lms_type, task_id)
     
+    request.response.status = 202
+    return {'task_id': task_id, 'status': 'queued'}
+
+
+@view_config(route_name='sync_task_status', request_method='GET', renderer='json')
+def get_sync_task_status(request):
+    """Get the state of a queued course sync"""
+    status = get_task_queue().get_status(request.matchdict['task_id'])
+    if status is None:
+        raise HTTPNotFound('Sync task not found')
+    return status
+
+
+def _sync_courses_task(lms_type):
+    """Background task: pull courses from the external LMS"""
+    integration_service = get_lms_integration_service()
+    result = getattr(integration_service, _SYNC_METHODS[lms_type])()
+    _invalidate_course_counts()
+    
+    log.info("Course sync completed for %s", lms_type)
+    return result
+
+
+def _create_and_patch_external_course(course_pk, lms_type, course_data):
+    """Background task: create the course in the external LMS and store its ID"""
     try:
-        integration_service = LMSIntegrationService()
-        
-        if lms_type == 'moodle':
-            result = integration_service.sync_moodle_courses()
-        elif lms_type == 'canvas':
-            result = integration_service.sync_canvas_courses()
-        elif lms_type == 'sakai':
-            result = integration_service.sync_sakai_courses()
-        elif lms_type == 'chamilo':
-            result = integration_service.sync_chamilo_courses()
-        else:
-            raise HTTPBadRequest('Unsupported LMS type')
-        
-        log.info(f"Course sync completed for {lms_type}")
-        
-        return result
-    except Exception as e:
-        log.error(f"Error syncing courses from {lms_type}: {str(e)}")
-        raise HTTPBadRequest(f'Error syncing courses: {str(e)}')
+        integration_service = get_lms_integration_service()
+        external_id = _create_course_in_external_lms(integration_service, lms_type, course_data)
+    except Exception as ext_error:
+        log.warning("Failed to create course in external LMS (%s): %s", lms_type, ext_error)
+        return
+    
+    if external_id:
+        DBSession.query(Course).filter(Course.id == course_pk).update(
+            {Course.external_id: str(external_id)}, synchronize_session=False
+        )
+        DBSession.commit()
+        log.info("Course created in external LMS (%s) with ID: %s", lms_type, external_id)
+
+
+def _update_external_course(course_pk, course_data):
+    """Background task: push local course changes to the external LMS"""
+    course = DBSession.get(Course, course_pk)
+    if not course or not course.external_id:
+        return
+    
+    try:
+        integration_service = get_lms_integration_service()
+        _update_course_in_external_lms(integration_service, course, course_data)
+        log.info("Course updated in external LMS (%s) with ID: %s", course.lms, course.external_id)
+    except Exception as ext_error:
+        log.warning("Failed to update course in external LMS (%s): %s", course.lms, ext_error)
 
 
 def _create_course_in_external_lms(integration_service, lms_type, course_data):
     """Helper function to create course in external LMS"""
-    if lms_type == 'moodle':
-        return integration_service.create_moodle_course(course_data)
-    elif lms_type == 'canvas':
-        return integration_service.create_canvas_course(course_data)
-    elif lms_type == 'sakai':
-        return integration_service.create_sakai_course(course_data)
-    elif lms_type == 'chamilo':
-        return integration_service.create_chamilo_course(course_data)
-    else:
+    method = _CREATE_METHODS.get(lms_type)
+    if method is None:
         raise Exception(f'Unsupported LMS type: {lms_type}')
+    return getattr(integration_service, method)(course_data)
 
 
 def _update_course_in_external_lms(integration_service, course, course_data):
@@ -245,17 +383,11 @@ def _update_course_in_external_lms(integration_service, course, course_data):
     lms_type = course.lms
     if lms_type == 'local':
         return  # No external update needed
-        
-    if lms_type == 'moodle':
-        return integration_service.update_moodle_course(course.external_id, course_data)
-    elif lms_type == 'canvas':
-        return integration_service.update_canvas_course(course.external_id, course_data)
-    elif lms_type == 'sakai':
-        return integration_service.update_sakai_course(course.external_id, course_data)
-    elif lms_type == 'chamilo':
-        return integration_service.update_chamilo_course(course.external_id, course_data)
-    else:
+    
+    method = _UPDATE_METHODS.get(lms_type)
+    if method is None:
         raise Exception(f'Unsupported LMS type: {lms_type}')
+    return getattr(integration_service, method)(course.external_id, course_data)
 
 
 @view_config(route_name='sync_status', request_method='GET', renderer='json')
@@ -283,13 +415,13 @@ def force_sync(request):
         sync_service = get_sync_service()
         result = sync_service.force_sync(lms_type)
         
-        log.info(f"Force sync initiated for {lms_type or 'all LMS'}")
+        log.info("Force sync initiated for %s", lms_type or 'all LMS')
         
         return result
     except ValueError as e:
         raise HTTPBadRequest(str(e))
     except Exception as e:
-        log.error(f"Error in force sync: {str(e)}")
+        log.error("Error in force sync: %s", e)
         raise HTTPBadRequest(f'Sync failed: {str(e)}')
 
 
@@ -308,12 +440,12 @@ def update_sync_config(request):
             sync_service = get_sync_service()
             sync_service.set_sync_interval(int(sync_interval))
             
-        log.info(f"Sync configuration updated")
+        log.info("Sync configuration updated")
         
         return {"status": "success", "message": "Configuration updated"}
         
     except ValueError as e:
         raise HTTPBadRequest(str(e))
     except Exception as e:
-        log.error(f"Error updating sync config: {str(e)}")
+        log.error("Error updating sync config: %s", e)
         raise HTTPBadRequest(f'Configuration update failed: {str(e)}')
\ No newline at end of file
@@ -9,19 +9,151 @@ from pyramid.view import view_config
 from pyramid.httpexceptions import (
     HTTPBadRequest, HTTPNotFound, HTTPForbidden, 
     HTTPUnauthorized, HTTPInternalServerError,
-    HTTPServiceUnavailable, HTTPGatewayTimeout
+    HTTPServiceUnavailable, HTTPGatewayTimeout, HTTPRequestEntityTooLarge,
+    HTTPException, HTTPNotModified
 )
+import hashlib
+import io
 import logging
 import os
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from ..auth import require_auth
+from . import get_pagination
+from ..services.cache_service import get_response_cache, get_single_flight
 from ..services.moodle_service import (
     MoodleService, MoodleError, MoodleAuthError, 
-    MoodleValidationError, MoodleNotFoundError
+    MoodleValidationError, MoodleNotFoundError,
+    get_moodle_service as get_shared_moodle_service, validate_enrolments
 )
 
 log = logging.getLogger(__name__)
 
 
+def _env_int(name, default):
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+# Site info, categories and the unfiltered course list are shared across users.
+# Entries are fresh for the TTL, then served stale (while one background
+# refresh runs) for MOODLE_CACHE_STALE_TTL more seconds.
+MOODLE_SITE_INFO_TTL = 300
+MOODLE_COURSES_TTL = _env_int('MOODLE_CACHE_TTL', 30)
+MOODLE_CACHE_STALE_TTL = _env_int('MOODLE_CACHE_STALE_TTL', 300)
+MOODLE_SITE_INFO_KEY = 'moodle:siteinfo'
+MOODLE_COURSES_KEY = 'moodle:courses:all'
+MOODLE_CATEGORIES_KEY = 'moodle:categories'
+# Profile lookups for logins (never credentials) are reused for a few minutes
+MOODLE_LOGIN_USER_TTL = _env_int('MOODLE_LOGIN_USER_TTL', 300)
+MOODLE_LOGIN_USER_KEY = 'moodle:login:user'
+moodle_cache = get_response_cache()
+moodle_single_flight = get_single_flight()
+
+# Shared pool for fanning out independent upstream calls within one request
+_fanout_executor = ThreadPoolExecutor(
+    max_workers=_env_int('MOODLE_FANOUT_WORKERS', 12), thread_name_prefix='moodle-fanout'
+)
+
+
+def _moodle_cache_key(prefix, moodle, params=None):
+    """Key cached Moodle data by site and token (the token is only hashed)"""
+    return moodle_cache.make_key(prefix, {**(params or {}), 'url': moodle.base_url, 'token': moodle.token})
+
+
+def _coalesced(name, moodle, params, func):
+    """Share one upstream Moodle call between concurrent identical requests"""
+    return moodle_single_flight.do(_moodle_cache_key(f'moodle:inflight:{name}', moodle, params), func)
+
+
+# Largest file accepted by the Moodle upload endpoints
+MAX_UPLOAD_BYTES = 100 * 1024 * 1024  # 100MB
+# Whole request body limit: the file plus room for multipart headers and form fields
+MAX_UPLOAD_REQUEST_BYTES = MAX_UPLOAD_BYTES + 1024 * 1024
+
+# Required request body fields, kept as module constants rather than rebuilt per request
+_MOODLE_COURSE_REQUIRED = ('fullname', 'shortname', 'categoryid')
+_ATTACH_REQUIRED = ('courseid', 'draftitemid', 'name')
+_ATTACH_BATCH_REQUIRED = ('courseids', 'draftitemid', 'name')
+_MOODLE_USER_REQUIRED = ('username', 'password', 'firstname', 'lastname', 'email')
+
+_LOG_SANITIZE = str.maketrans('', '', '\r\n')
+
+
+def _safe_log(value) -> str:
+    """Strip CR/LF from a value before logging it, to prevent log injection"""
+    return str(value).translate(_LOG_SANITIZE)
+
+
+def _parse_int(value, label, minimum=None):
+    """Parse an integer request parameter, answering bad input with a 400"""
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise HTTPBadRequest(f'Invalid {label}')
+    if minimum is not None and number < minimum:
+        raise HTTPBadRequest(f"{label} must be {'positive' if minimum > 0 else 'non-negative'} integer")
+    return number
+
+
+def _reject_oversize_request(request):
+    """Fail fast on Content-Length, before the multipart body is parsed"""
+    content_length = getattr(request, 'content_length', None)
+    if content_length and content_length > MAX_UPLOAD_REQUEST_BYTES:
+        raise HTTPRequestEntityTooLarge(f'Upload too large. Max 100MB, got {content_length/1024/1024:.1f}MB')
+
+
+def _check_upload_size(file_obj):
+    """Measure an uploaded file without reading it and reject oversize ones"""
+    stream = file_obj.file
+    if isinstance(stream, (io.BufferedRandom, io.FileIO)):
+        # WebOb spools uploads to a real temp file: rewind (which also flushes
+        # buffered writes) and take the size from one fstat
+        stream.seek(0)
+        file_size = os.fstat(stream.fileno()).st_size
+    else:
+        # In-memory/spooled buffers: fileno() would force a rollover to disk
+        stream.seek(0, 2)
+        file_size = stream.tell()
+        stream.seek(0)
+    
+    if file_size > MAX_UPLOAD_BYTES:
+        raise HTTPRequestEntityTooLarge(f'File too large. Max 100MB, got {file_size/1024/1024:.1f}MB')
+    return file_size
+
+
+def _invalidate_moodle_courses():
+    """Drop the cached Moodle course list after a course changes"""
+    moodle_cache.invalidate_prefix(MOODLE_COURSES_KEY)
+
+
+def _make_picker(fields):
+    """Compile a function that copies the given keys (with defaults) out of a dict
+    
+    Like models.build_row_serializer, the body is generated once so each call
+    is a single dict literal rather than a loop over the field list.
+    """
+    items = "\n".join(f"        {key!r}: src.get({key!r}, {default!r})," for key, default in fields)
+    source = f"def pick(src):\n    return {{\n{items}\n    }}\n"
+    namespace = {}
+    exec(compile(source, "<moodle picker>", "exec"), namespace)
+    return namespace['pick']
+
+
+# Response shapes for Moodle records, compiled at import
+_pick_site_function = _make_picker((('name', ''), ('version', '')))
+_pick_user = _make_picker((
+    ('id', None), ('username', None), ('firstname', None), ('lastname', None),
+    ('email', None), ('profileimagemobile', ''), ('profileimageurl', '')
+))
+_pick_user_summary = _make_picker((
+    ('id', None), ('username', None), ('firstname', None), ('lastname', None),
+    ('email', None), ('profileimageurl', '')
+))
+
+
 def normalize_moodle_response(success_data=None, error=None):
     """
     Normalize response format for frontend consumption
@@ -29,22 +161,77 @@ def normalize_moodle_response(success_data=None, error=None):
     Returns:
         Standard response format: { ok: boolean, data?: any, error?: { code, message, details? } }
     """
-    if error:
-        return {
-            'ok': False,
-            'error': {
-                'code': getattr(error, 'error_code', 'unknown'),
-                'message': str(error),
-                'details': getattr(error, 'details', None)
-            }
-        }
+    if not error:
+        return {'ok': True, 'data': success_data}
     
     return {
-        'ok': True,
-        'data': success_data
+        'ok': False,
+        'error': {
+            'code': getattr(error, 'error_code', 'unknown'),
+            'message': str(error),
+            'details': getattr(error, 'details', None)
+        }
     }
 
 
+# Read-mostly GETs carry an ETag so clients can revalidate with If-None-Match
+MOODLE_CACHE_CONTROL = f'private, max-age={MOODLE_COURSES_TTL}'
+_etag_memo = {}  # cache key -> (cached value, etag)
+
+
+def _moodle_etag(data, memo_key=None):
+    """ETag for a Moodle payload; reused while the cache returns the same object"""
+    if memo_key is not None:
+        memo = _etag_memo.get(memo_key)
+        if memo is not None and memo[0] is data:
+            return memo[1]
+    etag = hashlib.blake2b(orjson.dumps(data), digest_size=8).hexdigest()
+    if memo_key is not None:
+        _etag_memo[memo_key] = (data, etag)
+    return etag
+
+
+def conditional_moodle_response(request, data, memo_key=None):
+    """
+    Normalize data with validators, or answer 304 if the client's copy is current
+    
+    memo_key is the response-cache key the data came from, so repeat hits on
+    the same cached object skip re-hashing it.
+    """
+    etag = _moodle_etag(data, memo_key)
+    if_none_match = getattr(request, 'if_none_match', None)
+    if if_none_match is not None and etag in if_none_match:
+        not_modified = HTTPNotModified()
+        not_modified.etag = etag
+        not_modified.cache_control = MOODLE_CACHE_CONTROL
+        return not_modified
+    
+    request.response.etag = etag
+    request.response.cache_control = MOODLE_CACHE_CONTROL
+    return normalize_moodle_response(data)
+
+
+# Constant success responses, built once; views return them as-is (never mutate)
+_COURSE_UPDATED_OK = normalize_moodle_response({'message': 'Course updated successfully'})
+_COURSE_DELETED_OK = normalize_moodle_response({'message': 'Course deleted successfully'})
+_CONTENT_DELETED_OK = normalize_moodle_response({'message': 'Content deleted successfully'})
+
+
+_MOODLE_STATUS_HTTP = {
+    503: HTTPServiceUnavailable,
+    504: HTTPGatewayTimeout,
+}
+
+# Moodle error class -> picks the HTTP exception class for an error instance.
+# Looked up along the error's MRO, so subclasses map like their closest parent.
+_MOODLE_ERROR_HTTP = {
+    MoodleValidationError: lambda error: HTTPBadRequest,
+    MoodleNotFoundError: lambda error: HTTPNotFound,
+    MoodleAuthError: lambda error: HTTPUnauthorized if error.status_code == 401 else HTTPForbidden,
+    MoodleError: lambda error: _MOODLE_STATUS_HTTP.get(error.status_code, HTTPInternalServerError),
+}
+
+
 def handle_moodle_error(error: Exception):
     """
     Convert Moodle errors to appropriate HTTP exceptions
@@ -55,31 +242,23 @@ def handle_moodle_error(error: Exception):
     Raises:
         Appropriate HTTP exception
     """
-    if isinstance(error, MoodleAuthError):
-        if error.status_code == 401:
-            raise HTTPUnauthorized(str(error))
-        else:
-            raise HTTPForbidden(str(error))
-    elif isinstance(error, MoodleValidationError):
-        raise HTTPBadRequest(str(error))
-    elif isinstance(error, MoodleNotFoundError):
-        raise HTTPNotFound(str(error))
-    elif isinstance(error, MoodleError):
-        if error.status_code:
-            if error.status_code == 503:
-                raise HTTPServiceUnavailable(str(error))
-            elif error.status_code == 504:
-                raise HTTPGatewayTimeout(str(error))
-        raise HTTPInternalServerError(str(error))
-    else:
-        log.error(f"Unexpected error in Moodle API: {str(error)}")
-        raise HTTPInternalServerError("Internal server error")
+    if isinstance(error, HTTPException):
+        # Views re-raise these themselves; kept as a safety net
+        raise error
+    
+    for cls in type(error).__mro__:
+        pick_http_error = _MOODLE_ERROR_HTTP.get(cls)
+        if pick_http_error is not None:
+            raise pick_http_error(error)(str(error))
+    
+    log.error(f"Unexpected error in Moodle API: {str(error)}")
+    raise HTTPInternalServerError("Internal server error")
 
 
 def get_moodle_service():
     """Get configured Moodle service instance"""
     try:
-        return MoodleService()
+        return get_shared_moodle_service()
     except ValueError as e:
         log.error(f"Moodle service configuration error: {str(e)}")
         raise HTTPInternalServerError("Moodle service not configured")
@@ -94,25 +273,29 @@ def get_site_info(request):
     """
     try:
         moodle = get_moodle_service()
-        site_info = moodle.get_site_info()
-        
-        # Filter sensitive information if needed
-        filtered_info = {
-            'sitename': site_info.get('sitename'),
-            'release': site_info.get('release'),
-            'version': site_info.get('version'),
-            'mobilecssurl': site_info.get('mobilecssurl', ''),
-            'functions': [
-                {
-                    'name': func.get('name', ''),
-                    'version': func.get('version', '')
-                }
-                for func in site_info.get('functions', [])
-            ]
-        }
         
-        return normalize_moodle_response(filtered_info)
+        def load_site_info():
+            site_info = moodle.get_site_info()
+            
+            # Filter sensitive information if needed
+            return {
+                'sitename': site_info.get('sitename'),
+                'release': site_info.get('release'),
+                'version': site_info.get('version'),
+                'mobilecssurl': site_info.get('mobilecssurl', ''),
+                'functions': list(map(_pick_site_function, site_info.get('functions', [])))
+            }
+        
+        cache_key = _moodle_cache_key(MOODLE_SITE_INFO_KEY, moodle)
+        filtered_info = moodle_cache.get_or_load(
+            cache_key, load_site_info,
+            ttl=MOODLE_SITE_INFO_TTL, stale_ttl=MOODLE_CACHE_STALE_TTL
+        )
         
+        return conditional_moodle_response(request, filtered_info, cache_key)
+        
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -127,43 +310,43 @@ def list_courses(request):
     - search: Search term for course names
     - category: Filter by category ID
     """
+    # Parse before the Moodle call so a bad ID is a plain 400
+    search = request.params.get('search')
+    category = request.params.get('category')
+    category_id = _parse_int(category, 'category ID') if category else None
+    
     try:
-        log.info("[MOODLE API] Getting courses list...")
         moodle = get_moodle_service()
-        courses = moodle.list_courses()
-        
-        log.info(f"[MOODLE API] Raw courses from service: {len(courses) if courses else 0} courses")
-        log.info(f"[MOODLE API] First course sample: {courses[0] if courses else 'None'}")
-        
-        # Apply client-side filtering if needed
-        search = request.params.get('search')
-        if search:
-            search_lower = search.lower()
-            # Pre-compute lowercase values for efficiency
-            filtered_courses = []
-            for course in courses:
-                fullname_lower = course.get('fullname', '').lower()
-                shortname_lower = course.get('shortname', '').lower()
-                if search_lower in fullname_lower or search_lower in shortname_lower:
-                    filtered_courses.append(course)
-            courses = filtered_courses
-            log.info(f"[MOODLE API] After search filter: {len(courses)} courses")
-        
-        category = request.params.get('category')
-        if category:
-            try:
-                category_id = int(category)
+        
+        # Moodle filters server-side; only the unfiltered list is fetched whole
+        cache_key = None
+        if category_id is not None:
+            courses = moodle.get_courses_by_field('category', category_id)
+            if search:
+                # Moodle can't combine both filters in one call; narrow the category locally
+                # One lowered haystack per course: a single substring test instead of two
+                search_lower = search.lower()
                 courses = [
                     course for course in courses
-                    if course.get('categoryid') == category_id
+                    if search_lower in f"{course.get('fullname', '')}\x00{course.get('shortname', '')}".lower()
                 ]
-                log.info(f"[MOODLE API] After category filter: {len(courses)} courses")
-            except ValueError:
-                raise HTTPBadRequest("Invalid category ID")
+        elif search:
+            courses = moodle.search_courses(search, page=0, perpage=0).get('courses', [])
+        else:
+            cache_key = _moodle_cache_key(MOODLE_COURSES_KEY, moodle)
+            courses = moodle_cache.get_or_load(
+                cache_key, moodle.list_courses,
+                ttl=MOODLE_COURSES_TTL, stale_ttl=MOODLE_CACHE_STALE_TTL
+            )
         
-        log.info(f"[MOODLE API] Final courses to return: {len(courses)} courses")
-        return normalize_moodle_response(courses)
+        # Hot path: keep per-request logging at DEBUG and skip the sample repr unless enabled
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("[MOODLE API] Courses from service: %d", len(courses) if courses else 0)
+            log.debug("[MOODLE API] First course sample: %s", courses[0] if courses else None)
+        return conditional_moodle_response(request, courses, cache_key)
         
+    except HTTPException:
+        raise
     except Exception as e:
         log.error(f"[MOODLE API] Error getting courses: {str(e)}")
         handle_moodle_error(e)
@@ -194,20 +377,20 @@ def create_course(request):
         raise HTTPBadRequest('Invalid JSON')
     
     # Validate required fields
-    required_fields = ['fullname', 'shortname', 'categoryid']
-    for field in required_fields:
+    for field in _MOODLE_COURSE_REQUIRED:
         if field not in data or data[field] is None or (isinstance(data[field], str) and not data[field].strip()):
             raise HTTPBadRequest(f'{field} is required')
     
     try:
         moodle = get_moodle_service()
         course = moodle.create_course(data)
+        _invalidate_moodle_courses()
         
-        # Sanitize log output to prevent log injection
-        course_id = str(course.get('id', 'unknown')).replace('\n', '').replace('\r', '')
-        log.info(f"Course created in Moodle: {course_id}")
+        log.info(f"Course created in Moodle: {_safe_log(course.get('id', 'unknown'))}")
         return normalize_moodle_response(course)
         
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -238,22 +421,20 @@ def update_course(request):
     
     try:
         # Convert course_id to integer for Moodle
-        try:
-            course_id_int = int(course_id)
-        except ValueError:
-            raise HTTPBadRequest('Invalid course ID')
+        course_id_int = _parse_int(course_id, 'course ID')
         
         # Add course ID to update data
         update_data = {'id': course_id_int, **data}
         
         moodle = get_moodle_service()
         moodle.update_course(update_data)
+        _invalidate_moodle_courses()
         
-        # Sanitize log output to prevent log injection
-        safe_course_id = str(course_id).replace('\n', '').replace('\r', '')
-        log.info(f"Course updated in Moodle: {safe_course_id}")
-        return normalize_moodle_response({'message': 'Course updated successfully'})
+        log.info(f"Course updated in Moodle: {_safe_log(course_id)}")
+        return _COURSE_UPDATED_OK
         
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -263,7 +444,7 @@ def moodle_login(request):
     """
     POST /api/moodle/login
     
-    Authenticate user with Moodle credentials using configured token
+    Authenticate user with Moodle credentials via login/token.php
     Body:
     {
         "username": "moodle_username",
@@ -282,23 +463,25 @@ def moodle_login(request):
         raise HTTPBadRequest('Username and password required')
     
     try:
-        # Use configured Moodle service with admin token
         moodle = get_moodle_service()
         
-        # Get users by username to verify credentials
-        users = moodle.get_users_by_field('username', [username])
+        # token.php checks the password; bad credentials raise MoodleAuthError
+        token = moodle.get_user_token(username, password)
+        
+        # Profile fields come from the configured-token lookup, cached per username
+        users = moodle_cache.get_or_load(
+            _moodle_cache_key(MOODLE_LOGIN_USER_KEY, moodle, {'username': username}),
+            lambda: moodle.get_users_by_field('username', [username]),
+            ttl=MOODLE_LOGIN_USER_TTL
+        )
         
         if not users:
             raise HTTPUnauthorized('Invalid username or password')
         
         user = users[0]
         
-        # For security, we'll use the configured token but validate credentials
-        # In a real implementation, you'd verify the password properly
-        # This is a simplified approach using the admin token
-        
         return normalize_moodle_response({
-            'token': moodle.token,  # Use configured token
+            'token': token,
             'user': {
                 'id': user.get('id'),
                 'username': user.get('username'),
@@ -311,10 +494,12 @@ def moodle_login(request):
         })
         
     except MoodleAuthError as e:
-        log.warning(f"Moodle login failed for user {username}: {str(e)}")
+        log.warning(f"Moodle login failed for user {_safe_log(username)}: {str(e)}")
         raise HTTPUnauthorized(str(e))
+    except HTTPException:
+        raise
     except Exception as e:
-        log.error(f"Moodle login error for user {username}: {str(e)}")
+        log.error(f"Moodle login error for user {_safe_log(username)}: {str(e)}")
         handle_moodle_error(e)
 
 @view_config(route_name='moodle_enrol', request_method='POST', renderer='json')
@@ -351,18 +536,10 @@ def enrol_users(request):
         raise HTTPBadRequest('No enrolments provided')
     
     # Validate enrolment data
-    for i, enrolment in enumerate(enrolments):
-        required_fields = ['roleid', 'userid', 'courseid']
-        for field in required_fields:
-            if field not in enrolment:
-                raise HTTPBadRequest(f'Enrolment {i}: {field} is required')
-            # Validate field values
-            try:
-                value = int(enrolment[field])
-                if value <= 0:
-                    raise HTTPBadRequest(f'Enrolment {i}: {field} must be positive integer')
-            except (ValueError, TypeError):
-                raise HTTPBadRequest(f'Enrolment {i}: {field} must be integer')
+    try:
+        validate_enrolments(enrolments)
+    except MoodleValidationError as e:
+        raise HTTPBadRequest(str(e))
     
     try:
         moodle = get_moodle_service()
@@ -376,6 +553,8 @@ def enrol_users(request):
             'count': len(enrolments)
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -400,28 +579,25 @@ def get_users_by_field(request):
     if not values:
         raise HTTPBadRequest('values parameter is required')
     
-    # Parse comma-separated values
-    value_list = [v.strip() for v in values.split(',') if v.strip()]
+    # Parse comma-separated values, dropping duplicates but keeping order
+    value_list = list(dict.fromkeys(filter(None, map(str.strip, values.split(',')))))
     if not value_list:
         raise HTTPBadRequest('No valid values provided')
     
     try:
         moodle = get_moodle_service()
-        users = moodle.get_users_by_field(field, value_list)
-        
-        # Filter sensitive user information using list comprehension
-        filtered_users = [{
-            'id': user.get('id'),
-            'username': user.get('username'),
-            'firstname': user.get('firstname'),
-            'lastname': user.get('lastname'),
-            'email': user.get('email'),
-            'profileimagemobile': user.get('profileimagemobile', ''),
-            'profileimageurl': user.get('profileimageurl', '')
-        } for user in users]
+        users = _coalesced(
+            'users_by_field', moodle, {'field': field, 'values': ','.join(value_list)},
+            lambda: moodle.get_users_by_field(field, value_list)
+        )
         
-        return normalize_moodle_response(filtered_users)
+        # Filter sensitive user information
+        filtered_users = list(map(_pick_user, users))
         
+        return conditional_moodle_response(request, filtered_users)
+        
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -432,13 +608,7 @@ def validate_userid_param(request):
     if not userid:
         raise HTTPBadRequest('userid parameter is required')
     
-    try:
-        userid = int(userid)
-        if userid <= 0:
-            raise HTTPBadRequest('userid must be positive integer')
-        return userid
-    except ValueError:
-        raise HTTPBadRequest('Invalid userid')
+    return _parse_int(userid, 'userid', minimum=1)
 
 
 @view_config(route_name='moodle_notifications', request_method='GET', renderer='json')
@@ -455,26 +625,21 @@ def get_notifications(request):
     """
     userid = validate_userid_param(request)
     
-    try:
-        limit = int(request.params.get('limit', 20))
-        if limit > 100:
-            limit = 100
-    except ValueError:
-        limit = 20
+    _, limit = get_pagination(request.params, max_limit=100)
     
-    try:
-        offset = int(request.params.get('offset', 0))
-        if offset < 0:
-            offset = 0
-    except ValueError:
-        offset = 0
+    offset = max(0, _parse_int(request.params.get('offset', 0), 'offset'))
     
     try:
         moodle = get_moodle_service()
-        notifications = moodle.get_popup_notifications(userid, limit, offset)
+        notifications = _coalesced(
+            'notifications', moodle, {'userid': userid, 'limit': limit, 'offset': offset},
+            lambda: moodle.get_popup_notifications(userid, limit, offset)
+        )
         
         return normalize_moodle_response(notifications)
         
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -493,10 +658,15 @@ def get_unread_count(request):
     
     try:
         moodle = get_moodle_service()
-        count = moodle.get_unread_popup_count(userid)
+        count = _coalesced(
+            'unread_count', moodle, {'userid': userid},
+            lambda: moodle.get_unread_popup_count(userid)
+        )
         
         return normalize_moodle_response({'unread_count': count})
         
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -514,6 +684,8 @@ def upload_file(request):
     - component: Component name (optional, default 'user')
     - filearea: File area (optional, default 'draft')
     """
+    _reject_oversize_request(request)
+    
     # Check if file was uploaded
     if 'file' not in request.POST:
         raise HTTPBadRequest('No file uploaded')
@@ -523,31 +695,18 @@ def upload_file(request):
         raise HTTPBadRequest('Invalid file')
     
     # Get optional parameters with validation
-    try:
-        contextid = int(request.POST.get('contextid', 1))
-        if contextid <= 0:
-            raise HTTPBadRequest('contextid must be positive integer')
-    except ValueError:
-        raise HTTPBadRequest('Invalid contextid')
-    
+    contextid = _parse_int(request.POST.get('contextid', 1), 'contextid', minimum=1)
     component = request.POST.get('component', 'user')
     filearea = request.POST.get('filearea', 'draft')
+    itemid = _parse_int(request.POST.get('itemid', 0), 'itemid', minimum=0)
     
-    try:
-        itemid = int(request.POST.get('itemid', 0))
-        if itemid < 0:
-            raise HTTPBadRequest('itemid must be non-negative integer')
-    except ValueError:
-        raise HTTPBadRequest('Invalid itemid')
+    _check_upload_size(file_obj)
     
     try:
-        # Read file data
-        file_obj.file.seek(0)
-        file_data = file_obj.file.read()
-        
+        # Stream the upload straight through instead of reading it into memory
         moodle = get_moodle_service()
         result = moodle.upload_file(
-            file_data=file_data,
+            file_data=file_obj.file,
             filename=file_obj.filename,
             contextid=contextid,
             component=component,
@@ -556,9 +715,11 @@ def upload_file(request):
         )
         
         # Sanitize log output to prevent log injection and avoid logging sensitive filenames
-        log.info(f"File uploaded to Moodle")
+        log.info("File uploaded to Moodle")
         return normalize_moodle_response(result)
         
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -583,8 +744,7 @@ def attach_file_to_course(request):
     except ValueError:
         raise HTTPBadRequest('Invalid JSON')
     
-    required_fields = ['courseid', 'draftitemid', 'name']
-    for field in required_fields:
+    for field in _ATTACH_REQUIRED:
         if field not in data:
             raise HTTPBadRequest(f'{field} is required')
     
@@ -597,11 +757,62 @@ def attach_file_to_course(request):
             intro=data.get('intro', '')
         )
         
-        # Sanitize log output to prevent log injection
-        course_id = str(data['courseid']).replace('\n', '').replace('\r', '')
-        log.info(f"File attached to course {course_id} in Moodle")
+        log.info(f"File attached to course {_safe_log(data['courseid'])} in Moodle")
         return normalize_moodle_response(result)
         
+    except HTTPException:
+        raise
+    except Exception as e:
+        handle_moodle_error(e)
+
+
+@view_config(route_name='moodle_file_attach_batch', request_method='POST', renderer='json')
+def attach_file_to_courses(request):
+    """
+    POST /api/moodle/files/attach-batch
+    
+    Attach one uploaded file to several courses in parallel
+    
+    Body:
+    {
+        "courseids": [123, 124],
+        "draftitemid": 456,
+        "name": "Resource Name",
+        "intro": "Resource description"
+    }
+    """
+    try:
+        data = request.json_body
+    except ValueError:
+        raise HTTPBadRequest('Invalid JSON')
+    
+    for field in _ATTACH_BATCH_REQUIRED:
+        if field not in data:
+            raise HTTPBadRequest(f'{field} is required')
+    
+    courseids = data['courseids']
+    if not isinstance(courseids, list) or not courseids:
+        raise HTTPBadRequest('courseids must be a non-empty list')
+    
+    try:
+        moodle = get_moodle_service()
+        results = moodle.attach_file_to_courses(
+            courseids=list(dict.fromkeys(courseids)),
+            draftitemid=data['draftitemid'],
+            name=data['name'],
+            intro=data.get('intro', '')
+        )
+        
+        attached = sum(1 for result in results if result['ok'])
+        log.info(f"File attached to {attached}/{len(results)} courses in Moodle")
+        return normalize_moodle_response({
+            'results': results,
+            'attached': attached,
+            'failed': len(results) - attached
+        })
+        
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -615,8 +826,14 @@ def get_categories(request):
     """
     try:
         moodle = get_moodle_service()
-        categories = moodle.get_course_categories()
-        return normalize_moodle_response(categories)
+        cache_key = _moodle_cache_key(MOODLE_CATEGORIES_KEY, moodle)
+        categories = moodle_cache.get_or_load(
+            cache_key, moodle.get_course_categories,
+            ttl=MOODLE_SITE_INFO_TTL, stale_ttl=MOODLE_CACHE_STALE_TTL
+        )
+        return conditional_moodle_response(request, categories, cache_key)
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -648,16 +865,11 @@ def get_users(request):
         users = moodle.get_users(criteria)
         
         # Filter sensitive user information
-        filtered_users = [{
-            'id': user.get('id'),
-            'username': user.get('username'),
-            'firstname': user.get('firstname'),
-            'lastname': user.get('lastname'),
-            'email': user.get('email'),
-            'profileimageurl': user.get('profileimageurl', '')
-        } for user in users]
+        filtered_users = list(map(_pick_user_summary, users))
         
         return normalize_moodle_response(filtered_users)
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -677,6 +889,8 @@ def upload_file_core(request):
     - itemid: Item ID (optional, default 0)
     - filepath: File path (optional, default '/')
     """
+    _reject_oversize_request(request)
+    
     if 'file' not in request.POST:
         raise HTTPBadRequest('No file uploaded')
     
@@ -685,23 +899,20 @@ def upload_file_core(request):
         raise HTTPBadRequest('Invalid file')
     
     # Get optional parameters
-    try:
-        contextid = int(request.POST.get('contextid', 1))
-        itemid = int(request.POST.get('itemid', 0))
-    except ValueError:
-        raise HTTPBadRequest('Invalid contextid or itemid')
+    contextid = _parse_int(request.POST.get('contextid', 1), 'contextid')
+    itemid = _parse_int(request.POST.get('itemid', 0), 'itemid')
     
     component = request.POST.get('component', 'user')
     filearea = request.POST.get('filearea', 'draft')
     filepath = request.POST.get('filepath', '/')
     
+    _check_upload_size(file_obj)
+    
     try:
-        file_obj.file.seek(0)
-        file_data = file_obj.file.read()
-        
+        # The service base64-encodes the stream in chunks, never holding the raw file
         moodle = get_moodle_service()
         result = moodle.upload_file_core(
-            file_data=file_data,
+            file_data=file_obj.file,
             filename=file_obj.filename,
             contextid=contextid,
             component=component,
@@ -710,8 +921,10 @@ def upload_file_core(request):
             filepath=filepath
         )
         
-        log.info(f"File uploaded via core_files_upload: {file_obj.filename}")
+        log.info(f"File uploaded via core_files_upload: {_safe_log(file_obj.filename)}")
         return normalize_moodle_response(result)
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -737,8 +950,7 @@ def create_user(request):
     except ValueError:
         raise HTTPBadRequest('Invalid JSON')
     
-    required_fields = ['username', 'password', 'firstname', 'lastname', 'email']
-    for field in required_fields:
+    for field in _MOODLE_USER_REQUIRED:
         if field not in data:
             raise HTTPBadRequest(f'{field} is required')
     
@@ -755,8 +967,10 @@ def create_user(request):
             }]
         }
         result = moodle.call('core_user_create_users', user_data)
-        log.info(f"User created in Moodle: {data['username']}")
+        log.info(f"User created in Moodle: {_safe_log(data['username'])}")
         return normalize_moodle_response(result)
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -770,18 +984,18 @@ def delete_moodle_course(request):
     """
     course_id = request.matchdict['course_id']
     
-    try:
-        course_id_int = int(course_id)
-    except ValueError:
-        raise HTTPBadRequest('Invalid course ID')
+    course_id_int = _parse_int(course_id, 'course ID')
     
     try:
         moodle = get_moodle_service()
         result = moodle.delete_course(course_id_int)
+        _invalidate_moodle_courses()
         
-        log.info(f"Course deleted from Moodle: {course_id}")
-        return normalize_moodle_response({'message': 'Course deleted successfully'})
+        log.info(f"Course deleted from Moodle: {_safe_log(course_id)}")
+        return _COURSE_DELETED_OK
         
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -797,11 +1011,7 @@ def search_moodle_courses(request):
     if not search_term:
         raise HTTPBadRequest('Search term is required')
     
-    try:
-        page = int(request.params.get('page', 0))
-        limit = min(int(request.params.get('limit', 20)), 100)
-    except ValueError:
-        page, limit = 0, 20
+    page, limit = get_pagination(request.params, max_limit=100, first_page=0)
     
     try:
         moodle = get_moodle_service()
@@ -809,6 +1019,8 @@ def search_moodle_courses(request):
         
         return normalize_moodle_response(results)
         
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -837,10 +1049,7 @@ def validate_moodle_file(request):
     if not filename:
         raise HTTPBadRequest('Filename is required')
     
-    try:
-        filesize = int(filesize)
-    except (ValueError, TypeError):
-        raise HTTPBadRequest('Invalid file size')
+    filesize = _parse_int(filesize, 'file size')
     
     try:
         moodle = get_moodle_service()
@@ -848,6 +1057,8 @@ def validate_moodle_file(request):
         
         return normalize_moodle_response(validation_result)
         
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -863,22 +1074,19 @@ def get_moodle_instructor_dashboard(request):
     if not userid:
         raise HTTPBadRequest('userid parameter is required')
     
-    try:
-        userid = int(userid)
-    except ValueError:
-        raise HTTPBadRequest('Invalid userid')
+    userid = _parse_int(userid, 'userid')
     
     try:
         moodle = get_moodle_service()
         
-        # Get instructor's courses
-        enrolled_courses = moodle.get_enrolled_courses(userid)
-        
-        # Get error notifications
-        error_notifications = moodle.get_error_notifications(userid)
-        
-        # Get recent notifications count
-        unread_count = moodle.get_unread_popup_count(userid)
+        # The three lookups are independent; run them concurrently on the
+        # service's pooled session so latency is the slowest call, not the sum
+        courses_future = _fanout_executor.submit(moodle.get_enrolled_courses, userid)
+        errors_future = _fanout_executor.submit(moodle.get_error_notifications, userid)
+        unread_future = _fanout_executor.submit(moodle.get_unread_popup_count, userid)
+        enrolled_courses = courses_future.result()
+        error_notifications = errors_future.result()
+        unread_count = unread_future.result()
         
         dashboard_data = {
             'courses': enrolled_courses,
@@ -889,6 +1097,8 @@ def get_moodle_instructor_dashboard(request):
         
         return normalize_moodle_response(dashboard_data)
         
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 @view_config(route_name='moodle_course_contents', request_method='GET', renderer='json')
@@ -900,15 +1110,14 @@ def get_moodle_course_contents(request):
     """
     course_id = request.matchdict['course_id']
     
-    try:
-        course_id_int = int(course_id)
-    except ValueError:
-        raise HTTPBadRequest('Invalid course ID')
+    course_id_int = _parse_int(course_id, 'course ID')
     
     try:
         moodle = get_moodle_service()
         contents = moodle.get_course_contents(course_id_int)
-        return normalize_moodle_response(contents)
+        return conditional_moodle_response(request, contents)
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -922,17 +1131,16 @@ def delete_moodle_content(request):
     """
     module_id = request.matchdict['module_id']
     
-    try:
-        module_id_int = int(module_id)
-    except ValueError:
-        raise HTTPBadRequest('Invalid module ID')
+    module_id_int = _parse_int(module_id, 'module ID')
     
     try:
         moodle = get_moodle_service()
         moodle.delete_course_module(module_id_int)
         
-        log.info(f"Course module deleted from Moodle: {module_id}")
-        return normalize_moodle_response({'message': 'Content deleted successfully'})
+        log.info(f"Course module deleted from Moodle: {_safe_log(module_id)}")
+        return _CONTENT_DELETED_OK
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
 
@@ -944,12 +1152,11 @@ def upload_file_to_course(request):
     
     Upload file directly to a course
     """
+    _reject_oversize_request(request)
+    
     course_id = request.matchdict['course_id']
     
-    try:
-        course_id_int = int(course_id)
-    except ValueError:
-        raise HTTPBadRequest('Invalid course ID')
+    course_id_int = _parse_int(course_id, 'course ID')
     
     if 'file' not in request.POST:
         raise HTTPBadRequest('No file uploaded')
@@ -959,22 +1166,14 @@ def upload_file_to_course(request):
         raise HTTPBadRequest('Invalid file')
     
     # Validate file size
-    file_obj.file.seek(0, 2)
-    file_size = file_obj.file.tell()
-    file_obj.file.seek(0)
-    
-    MAX_SIZE = 100 * 1024 * 1024  # 100MB
-    if file_size > MAX_SIZE:
-        raise HTTPBadRequest(f'File too large. Max 100MB, got {file_size/1024/1024:.1f}MB')
+    _check_upload_size(file_obj)
     
     try:
-        file_data = file_obj.file.read()
-        
         moodle = get_moodle_service()
         
-        # Upload to draft area first
+        # Upload to draft area first (streamed from the request body file)
         upload_result = moodle.upload_file(
-            file_data=file_data,
+            file_data=file_obj.file,
             filename=file_obj.filename
         )
         
@@ -987,7 +1186,7 @@ def upload_file_to_course(request):
                 intro=request.POST.get('intro', '')
             )
             
-            log.info(f"File uploaded to course {course_id}: {file_obj.filename}")
+            log.info(f"File uploaded to course {course_id_int}: {_safe_log(file_obj.filename)}")
             return normalize_moodle_response({
                 'upload': upload_result,
                 'attach': attach_result,
@@ -995,5 +1194,7 @@ def upload_file_to_course(request):
             })
         
         return normalize_moodle_response(upload_result)
+    except HTTPException:
+        raise
     except Exception as e:
         handle_moodle_error(e)
@@ -79,7 +79,7 @@ if __name__ == '__main__':
     
     try:
         # Serve the composed app (so /api works)
-        serve(create_app(), host=host, port=port, threads=6)
+        serve(create_app(), host=host, port=port, threads=int(os.getenv('WAITRESS_THREADS', 24)))
     except KeyboardInterrupt:
         print("\n👋 Server stopped")
     except Exception as e:
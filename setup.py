@@ -10,6 +10,9 @@ requires = [
     'PyJWT',
     'bcrypt',
     'requests',
+    'requests-toolbelt',
+    'fastjsonschema',
+    'orjson',
     'marshmallow',
     'waitress',
     'python-dotenv',
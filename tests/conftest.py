@@ -0,0 +1,11 @@
+import pytest
+
+from lms_api.services.cache_service import get_response_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    """Keep cached view responses from leaking between tests"""
+    get_response_cache().clear()
+    yield
+    get_response_cache().clear()
@@ -0,0 +1,60 @@
+"""
+Tests for the in-process response cache
+"""
+
+import time
+
+from lms_api.services.cache_service import ResponseCache
+
+
+class TestResponseCache:
+    """Test cases for ResponseCache"""
+
+    def test_get_returns_stored_value(self):
+        """Test a fresh entry is returned"""
+        cache = ResponseCache()
+        cache.set('k', {'a': 1}, ttl=60)
+
+        assert cache.get('k') == {'a': 1}
+
+    def test_expired_entry_is_dropped(self):
+        """Test an expired entry is removed when read"""
+        cache = ResponseCache()
+        cache.set('k', 'v', ttl=-1)
+
+        assert cache.get('k') is None
+        assert 'k' not in cache._entries
+
+    def test_excess_entries_are_evicted(self):
+        """Test the cache never holds more than max_entries keys"""
+        cache = ResponseCache(max_entries=3)
+        for i in range(10):
+            cache.set(f'search:{i}', i, ttl=60)
+
+        assert len(cache._entries) == 3
+        assert cache.get('search:0') is None
+        assert cache.get('search:9') == 9
+
+    def test_eviction_is_least_recently_used(self):
+        """Test a recently read entry survives eviction"""
+        cache = ResponseCache(max_entries=2)
+        cache.set('a', 1, ttl=60)
+        cache.set('b', 2, ttl=60)
+        cache.get('a')
+        cache.set('c', 3, ttl=60)
+
+        assert cache.get('a') == 1
+        assert cache.get('b') is None
+        assert cache.get('c') == 3
+
+    def test_stale_entry_served_while_refreshing(self):
+        """Test get_or_load serves a stale value and refreshes it in the background"""
+        cache = ResponseCache()
+        cache.set('k', 'old', ttl=-1, stale_ttl=60)
+
+        assert cache.get_or_load('k', lambda: 'new', ttl=60, stale_ttl=60) == 'old'
+
+        deadline = time.monotonic() + 2
+        while cache.get('k') != 'new' and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert cache.get('k') == 'new'
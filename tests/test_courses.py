@@ -0,0 +1,204 @@
+"""
+Tests for the local course views
+
+Runs the views against an in-memory SQLite database bound to DBSession.
+"""
+
+import logging
+from types import SimpleNamespace
+
+import pytest
+from unittest.mock import patch, Mock
+from pyramid import testing
+from pyramid.httpexceptions import HTTPBadRequest, HTTPNotFound
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.pool import StaticPool
+
+from lms_api.models import DBSession, Base
+from lms_api.models.course import Course
+from lms_api.models.content import CourseContent
+from lms_api.models.user import User
+from lms_api.services.task_queue import BackgroundTaskQueue
+from lms_api.views.courses import (
+    get_courses, delete_course, _course_search_filter,
+    _create_and_patch_external_course, _update_external_course
+)
+
+
+@pytest.fixture
+def db_session():
+    """Fresh in-memory database shared by every thread of the test"""
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    DBSession.remove()
+    DBSession.configure(bind=engine)
+    Base.metadata.create_all(engine)
+    yield DBSession
+    DBSession.remove()
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def _add_course(session, course_id='C1', lms='local', name='Course 1', **fields):
+    course = Course(course_id=course_id, name=name, short_name=course_id, lms=lms, **fields)
+    session.add(course)
+    session.commit()
+    return course
+
+
+def _compile_for_postgresql(clause):
+    """Render a filter as PostgreSQL SQL with its bound values inlined"""
+    with patch.object(DBSession, 'get_bind', return_value=SimpleNamespace(dialect=postgresql.dialect())):
+        built = clause()
+    return str(built.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+
+
+class TestCourseSearch:
+    """Test cases for GET /courses?search="""
+
+    def test_search_matches_substring(self, db_session):
+        """Test the default search finds a term in the middle of a word"""
+        _add_course(db_session, course_id='BIO', name='Biology')
+        _add_course(db_session, course_id='HIS', name='History')
+
+        result = get_courses(testing.DummyRequest(params={'search': 'ology'}))
+
+        assert [course['name'] for course in result['courses']] == ['Biology']
+        assert result['pagination']['total'] == 1
+
+    def test_default_search_is_substring_on_postgresql(self):
+        """Test PostgreSQL keeps ILIKE substring matching unless words mode is asked for"""
+        sql = _compile_for_postgresql(lambda: _course_search_filter('ology'))
+
+        assert 'ILIKE' in sql
+        assert '%ology%' in sql
+        assert 'to_tsquery' not in sql
+
+    def test_words_mode_uses_full_text_on_postgresql(self):
+        """Test words mode prefix-matches every word through the full-text index"""
+        sql = _compile_for_postgresql(lambda: _course_search_filter('bio chem', 'words'))
+
+        assert 'to_tsquery' in sql
+        assert 'bio:* & chem:*' in sql
+
+
+class TestDeleteCourse:
+    """Test cases for DELETE /courses/{course_id}"""
+
+    def test_delete_course_success(self, db_session):
+        """Test deleting a course without content"""
+        _add_course(db_session)
+
+        request = testing.DummyRequest(matchdict={'course_id': 'C1'})
+        result = delete_course(request)
+
+        assert result == {'message': 'Course deleted successfully'}
+        assert db_session.query(Course).count() == 0
+
+    def test_delete_course_not_found(self, db_session):
+        """Test deleting a course that doesn't exist"""
+        request = testing.DummyRequest(matchdict={'course_id': 'missing'})
+
+        with pytest.raises(HTTPNotFound):
+            delete_course(request)
+
+    def test_delete_course_with_content_is_refused(self, db_session):
+        """Test a course with content is kept rather than leaving orphaned rows"""
+        _add_course(db_session)
+        user = User(username='teacher', email='teacher@example.com', password_hash='x')
+        db_session.add(user)
+        db_session.flush()
+        db_session.add(CourseContent(
+            course_id='C1', title='Notes', content_type='text', uploaded_by=user.id
+        ))
+        db_session.commit()
+
+        request = testing.DummyRequest(matchdict={'course_id': 'C1'})
+
+        with pytest.raises(HTTPBadRequest):
+            delete_course(request)
+
+        assert db_session.query(Course).count() == 1
+        assert db_session.query(CourseContent).count() == 1
+
+
+class TestExternalCourseTasks:
+    """Test cases for the external LMS background tasks, run synchronously"""
+
+    @patch('lms_api.views.courses.get_lms_integration_service')
+    def test_create_patches_external_id(self, mock_get_service, db_session):
+        """Test the external ID returned by the LMS is stored on the course"""
+        course_id = _add_course(db_session).id
+        mock_service = Mock()
+        mock_service.create_moodle_course.return_value = 42
+        mock_get_service.return_value = mock_service
+
+        BackgroundTaskQueue._run(_create_and_patch_external_course, course_id, 'moodle', {'name': 'Course 1'})
+
+        assert db_session.get(Course, course_id).external_id == '42'
+        mock_service.create_moodle_course.assert_called_once_with({'name': 'Course 1'})
+
+    @patch('lms_api.views.courses.get_lms_integration_service')
+    def test_create_external_failure_is_logged(self, mock_get_service, db_session, caplog):
+        """Test an LMS failure is logged and leaves the course unlinked"""
+        course_id = _add_course(db_session).id
+        mock_service = Mock()
+        mock_service.create_moodle_course.side_effect = RuntimeError('moodle down')
+        mock_get_service.return_value = mock_service
+
+        with caplog.at_level(logging.WARNING):
+            BackgroundTaskQueue._run(_create_and_patch_external_course, course_id, 'moodle', {})
+
+        assert 'Failed to create course in external LMS (moodle): moodle down' in caplog.text
+        assert db_session.get(Course, course_id).external_id is None
+
+    @patch('lms_api.views.courses.get_lms_integration_service')
+    def test_create_database_failure_is_rolled_back(self, mock_get_service, db_session, caplog):
+        """Test a failed external_id write is logged and rolled back"""
+        course_id = _add_course(db_session).id
+        mock_service = Mock()
+        mock_service.create_moodle_course.return_value = 42
+        mock_get_service.return_value = mock_service
+
+        with patch.object(DBSession, 'commit', side_effect=RuntimeError('disk full')), \
+                patch.object(DBSession, 'rollback', wraps=DBSession.rollback) as mock_rollback, \
+                caplog.at_level(logging.ERROR):
+            with pytest.raises(RuntimeError):
+                BackgroundTaskQueue._run(_create_and_patch_external_course, course_id, 'moodle', {})
+
+        mock_rollback.assert_called_once()
+        assert 'Background task _create_and_patch_external_course failed: disk full' in caplog.text
+        assert db_session.get(Course, course_id).external_id is None
+
+    @patch('lms_api.views.courses.get_lms_integration_service')
+    def test_update_pushes_changes(self, mock_get_service, db_session):
+        """Test local changes are sent to the LMS by external ID"""
+        course_id = _add_course(db_session, lms='moodle', external_id='7').id
+        mock_service = Mock()
+        mock_get_service.return_value = mock_service
+
+        BackgroundTaskQueue._run(_update_external_course, course_id, {'name': 'Renamed'})
+
+        mock_service.update_moodle_course.assert_called_once_with('7', {'name': 'Renamed'})
+
+    @patch('lms_api.views.courses.get_lms_integration_service')
+    def test_update_external_failure_is_logged(self, mock_get_service, db_session, caplog):
+        """Test an LMS update failure is logged, not raised"""
+        course_id = _add_course(db_session, lms='moodle', external_id='7').id
+        mock_service = Mock()
+        mock_service.update_moodle_course.side_effect = RuntimeError('moodle down')
+        mock_get_service.return_value = mock_service
+
+        with caplog.at_level(logging.WARNING):
+            BackgroundTaskQueue._run(_update_external_course, course_id, {'name': 'Renamed'})
+
+        assert 'Failed to update course in external LMS (moodle): moodle down' in caplog.text
+
+    @patch('lms_api.views.courses.get_lms_integration_service')
+    def test_update_skips_unlinked_course(self, mock_get_service, db_session):
+        """Test a course without an external ID is not pushed"""
+        course_id = _add_course(db_session).id
+
+        BackgroundTaskQueue._run(_update_external_course, course_id, {'name': 'Renamed'})
+
+        mock_get_service.assert_not_called()
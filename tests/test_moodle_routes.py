@@ -9,12 +9,13 @@ import pytest
 import json
 from unittest.mock import patch, Mock
 from pyramid import testing
-from pyramid.httpexceptions import HTTPBadRequest, HTTPNotFound, HTTPForbidden
+from pyramid.httpexceptions import HTTPBadRequest, HTTPNotFound, HTTPForbidden, HTTPUnauthorized
 
 from lms_api.views.moodle import (
     get_site_info, list_courses, create_course, update_course,
     enrol_users, get_users_by_field, get_notifications, get_unread_count,
-    upload_file, attach_file_to_course
+    upload_file, attach_file_to_course, attach_file_to_courses,
+    get_moodle_instructor_dashboard, moodle_login
 )
 from lms_api.services.moodle_service import (
     MoodleError, MoodleAuthError, MoodleValidationError, MoodleNotFoundError
@@ -108,15 +109,35 @@ class TestMoodleRoutes:
         assert len(result['data']) == 2
         assert result['data'][0]['fullname'] == 'Course 1'
     
+    @patch('lms_api.views.moodle.get_moodle_service')
+    def test_list_courses_not_modified(self, mock_get_service, request_factory):
+        """Test a matching If-None-Match gets a bodiless 304"""
+        mock_service = Mock()
+        mock_service.list_courses.return_value = [{'id': 1, 'fullname': 'Course 1'}]
+        mock_get_service.return_value = mock_service
+        
+        first = request_factory()
+        list_courses(first)
+        etag = first.response.etag
+        assert etag
+        
+        second = request_factory()
+        second.if_none_match = [etag]
+        result = list_courses(second)
+        
+        assert result.status_code == 304
+        assert result.etag == etag
+    
     @patch('lms_api.views.moodle.get_moodle_service')
     def test_list_courses_with_search(self, mock_get_service, request_factory):
         """Test course listing with search filter"""
         mock_service = Mock()
-        mock_service.list_courses.return_value = [
-            {'id': 1, 'fullname': 'Python Programming', 'shortname': 'PY101'},
-            {'id': 2, 'fullname': 'Java Programming', 'shortname': 'JV101'},
-            {'id': 3, 'fullname': 'Web Development', 'shortname': 'WEB101'}
-        ]
+        mock_service.search_courses.return_value = {
+            'courses': [
+                {'id': 1, 'fullname': 'Python Programming', 'shortname': 'PY101'}
+            ],
+            'total': 1
+        }
         mock_get_service.return_value = mock_service
         
         request = request_factory(params={'search': 'python'})
@@ -126,14 +147,15 @@ class TestMoodleRoutes:
         assert result['ok'] is True
         assert len(result['data']) == 1
         assert result['data'][0]['fullname'] == 'Python Programming'
+        mock_service.search_courses.assert_called_once_with('python', page=0, perpage=0)
+        mock_service.list_courses.assert_not_called()
     
     @patch('lms_api.views.moodle.get_moodle_service')
     def test_list_courses_with_category_filter(self, mock_get_service, request_factory):
         """Test course listing with category filter"""
         mock_service = Mock()
-        mock_service.list_courses.return_value = [
+        mock_service.get_courses_by_field.return_value = [
             {'id': 1, 'fullname': 'Course 1', 'categoryid': 1},
-            {'id': 2, 'fullname': 'Course 2', 'categoryid': 2},
             {'id': 3, 'fullname': 'Course 3', 'categoryid': 1}
         ]
         mock_get_service.return_value = mock_service
@@ -145,6 +167,8 @@ class TestMoodleRoutes:
         assert result['ok'] is True
         assert len(result['data']) == 2
         assert all(course['categoryid'] == 1 for course in result['data'])
+        mock_service.get_courses_by_field.assert_called_once_with('category', 1)
+        mock_service.list_courses.assert_not_called()
     
     @patch('lms_api.views.moodle.get_moodle_service')
     def test_create_course_success(self, mock_get_service, request_factory):
@@ -235,6 +259,39 @@ class TestMoodleRoutes:
         with pytest.raises(Exception):  # Should raise HTTPBadRequest
             update_course(request)
     
+    @patch('lms_api.views.moodle.get_moodle_service')
+    def test_moodle_login_success(self, mock_get_service, request_factory):
+        """Test login verifies credentials and caches the profile lookup"""
+        mock_service = Mock()
+        mock_service.get_user_token.return_value = 'user-token'
+        mock_service.get_users_by_field.return_value = [
+            {'id': 7, 'username': 'jdoe', 'firstname': 'Jane', 'lastname': 'Doe'}
+        ]
+        mock_get_service.return_value = mock_service
+        
+        credentials = {'username': 'jdoe', 'password': 'secret'}
+        result = moodle_login(request_factory(method='POST', json_body=credentials))
+        moodle_login(request_factory(method='POST', json_body=credentials))
+        
+        assert result['ok'] is True
+        assert result['data']['token'] == 'user-token'
+        assert result['data']['user']['fullname'] == 'Jane Doe'
+        assert mock_service.get_user_token.call_count == 2
+        mock_service.get_users_by_field.assert_called_once_with('username', ['jdoe'])
+    
+    @patch('lms_api.views.moodle.get_moodle_service')
+    def test_moodle_login_bad_password(self, mock_get_service, request_factory):
+        """Test login with credentials Moodle rejects"""
+        mock_service = Mock()
+        mock_service.get_user_token.side_effect = MoodleAuthError("Authentication failed: invalidlogin")
+        mock_get_service.return_value = mock_service
+        
+        request = request_factory(method='POST', json_body={'username': 'jdoe', 'password': 'wrong'})
+        
+        with pytest.raises(HTTPUnauthorized):
+            moodle_login(request)
+        mock_service.get_users_by_field.assert_not_called()
+    
     @patch('lms_api.views.moodle.get_moodle_service')
     def test_enrol_users_success(self, mock_get_service, request_factory):
         """Test successful user enrolment"""
@@ -302,6 +359,19 @@ class TestMoodleRoutes:
         
         mock_service.get_users_by_field.assert_called_once_with('email', ['john@example.com'])
     
+    @patch('lms_api.views.moodle.get_moodle_service')
+    def test_get_users_by_field_dedupes_values(self, mock_get_service, request_factory):
+        """Test duplicate values are collapsed before calling Moodle"""
+        mock_service = Mock()
+        mock_service.get_users_by_field.return_value = []
+        mock_get_service.return_value = mock_service
+        
+        request = request_factory(params={'field': 'id', 'values': '3, 1,3,,1'})
+        
+        get_users_by_field(request)
+        
+        mock_service.get_users_by_field.assert_called_once_with('id', ['3', '1'])
+    
     def test_get_users_by_field_missing_params(self, request_factory):
         """Test user retrieval with missing parameters"""
         # Missing field parameter
@@ -368,6 +438,28 @@ class TestMoodleRoutes:
         
         mock_service.get_unread_popup_count.assert_called_once_with(123)
     
+    @patch('lms_api.views.moodle.get_moodle_service')
+    def test_instructor_dashboard_success(self, mock_get_service, request_factory):
+        """Test dashboard combines the three concurrent lookups"""
+        mock_service = Mock()
+        mock_service.get_enrolled_courses.return_value = [{'id': 1}, {'id': 2}]
+        mock_service.get_error_notifications.return_value = [{'id': 7}]
+        mock_service.get_unread_popup_count.return_value = 3
+        mock_get_service.return_value = mock_service
+        
+        request = request_factory(params={'userid': '123'})
+        
+        result = get_moodle_instructor_dashboard(request)
+        
+        assert result['ok'] is True
+        assert result['data']['total_courses'] == 2
+        assert result['data']['error_notifications'] == [{'id': 7}]
+        assert result['data']['unread_notifications_count'] == 3
+        
+        mock_service.get_enrolled_courses.assert_called_once_with(123)
+        mock_service.get_error_notifications.assert_called_once_with(123)
+        mock_service.get_unread_popup_count.assert_called_once_with(123)
+    
     @patch('lms_api.views.moodle.get_moodle_service')
     def test_upload_file_success(self, mock_get_service, request_factory):
         """Test successful file upload"""
@@ -384,6 +476,7 @@ class TestMoodleRoutes:
         mock_file.file = Mock()
         mock_file.file.read.return_value = b'file content'
         mock_file.file.seek.return_value = None
+        mock_file.file.tell.return_value = len(b'file content')
         
         post_data = {
             'file': mock_file,
@@ -401,7 +494,8 @@ class TestMoodleRoutes:
         mock_service.upload_file.assert_called_once()
         call_args = mock_service.upload_file.call_args
         assert call_args[1]['filename'] == 'test.pdf'
-        assert call_args[1]['file_data'] == b'file content'
+        assert call_args[1]['file_data'] is mock_file.file
+        mock_file.file.read.assert_not_called()
     
     def test_upload_file_no_file(self, request_factory):
         """Test file upload with no file provided"""
@@ -440,6 +534,34 @@ class TestMoodleRoutes:
             intro='Test resource description'
         )
     
+    @patch('lms_api.views.moodle.get_moodle_service')
+    def test_attach_file_to_courses_batch(self, mock_get_service, request_factory):
+        """Test attaching one file to several courses"""
+        mock_service = Mock()
+        mock_service.attach_file_to_courses.return_value = [
+            {'courseid': 1, 'ok': True, 'result': {'resourceid': 10}},
+            {'courseid': 2, 'ok': False, 'error': 'Course not found'}
+        ]
+        mock_get_service.return_value = mock_service
+        
+        request = request_factory(method='POST', json_body={
+            'courseids': [1, 2, 1],
+            'draftitemid': 456,
+            'name': 'Shared Resource'
+        })
+        
+        result = attach_file_to_courses(request)
+        
+        assert result['ok'] is True
+        assert result['data']['attached'] == 1
+        assert result['data']['failed'] == 1
+        mock_service.attach_file_to_courses.assert_called_once_with(
+            courseids=[1, 2],
+            draftitemid=456,
+            name='Shared Resource',
+            intro=''
+        )
+    
     def test_attach_file_missing_fields(self, request_factory):
         """Test file attachment with missing required fields"""
         request = request_factory(method='POST', json_body={'courseid': 123})
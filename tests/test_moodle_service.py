@@ -8,12 +8,16 @@ to ensure proper parameter encoding, error handling, and retry logic.
 import pytest
 import requests
 from unittest.mock import patch, Mock
+import base64
+import io
 import json
 import os
+from urllib.parse import parse_qs
 
 from lms_api.services.moodle_service import (
     MoodleService, MoodleError, MoodleAuthError, 
-    MoodleValidationError, MoodleNotFoundError, MoodleParamEncoder
+    MoodleValidationError, MoodleNotFoundError, MoodleParamEncoder,
+    get_moodle_service
 )
 
 
@@ -138,7 +142,16 @@ class TestMoodleService:
         )
         assert service2.base_url == 'https://moodle.test.com/webservice/rest/server.php'
     
-    @patch('requests.post')
+    def test_shared_service_is_reused(self, mock_env):
+        """Test get_moodle_service returns one pooled instance per process"""
+        with patch('lms_api.services.moodle_service._moodle_service', None):
+            first = get_moodle_service()
+            second = get_moodle_service()
+        
+        assert first is second
+        assert isinstance(first.session, requests.Session)
+    
+    @patch('requests.Session.post')
     def test_successful_api_call(self, mock_post, moodle_service):
         """Test successful API call with proper request format"""
         # Mock successful response
@@ -174,7 +187,7 @@ class TestMoodleService:
         # Check result
         assert result == {'sitename': 'Test Site', 'version': '4.0'}
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_api_call_with_params(self, mock_post, moodle_service):
         """Test API call with complex parameters"""
         mock_response = Mock()
@@ -196,7 +209,7 @@ class TestMoodleService:
         assert call_data['courses[0][shortname]'] == 'NC'
         assert call_data['courses[0][categoryid]'] == '1'
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_moodle_error_handling(self, mock_post, moodle_service):
         """Test handling of Moodle-specific errors"""
         mock_response = Mock()
@@ -214,7 +227,7 @@ class TestMoodleService:
         assert exc_info.value.error_code == 'invalidparameter'
         assert 'Validation error' in str(exc_info.value)
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_auth_error_handling(self, mock_post, moodle_service):
         """Test handling of authentication errors"""
         mock_response = Mock()
@@ -232,7 +245,7 @@ class TestMoodleService:
         assert exc_info.value.error_code == 'invalidtoken'
         assert exc_info.value.status_code == 401
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_not_found_error_handling(self, mock_post, moodle_service):
         """Test handling of not found errors"""
         mock_response = Mock()
@@ -250,7 +263,7 @@ class TestMoodleService:
         assert exc_info.value.error_code == 'invaliduser'
         assert exc_info.value.status_code == 404
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_timeout_handling(self, mock_post, moodle_service):
         """Test handling of request timeouts"""
         mock_post.side_effect = requests.exceptions.Timeout()
@@ -261,7 +274,7 @@ class TestMoodleService:
         assert 'timeout' in str(exc_info.value).lower()
         assert exc_info.value.status_code == 504
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_connection_error_handling(self, mock_post, moodle_service):
         """Test handling of connection errors"""
         mock_post.side_effect = requests.exceptions.ConnectionError()
@@ -272,7 +285,7 @@ class TestMoodleService:
         assert 'connection error' in str(exc_info.value).lower()
         assert exc_info.value.status_code == 503
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_retry_logic_for_idempotent_operations(self, mock_post, moodle_service):
         """Test retry logic for idempotent GET-like operations"""
         # First call fails with timeout, second succeeds
@@ -291,7 +304,7 @@ class TestMoodleService:
         assert mock_post.call_count == 2
         assert result == {'sitename': 'Test Site'}
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_no_retry_for_non_idempotent_operations(self, mock_post, moodle_service):
         """Test that non-idempotent operations are not retried"""
         mock_post.side_effect = requests.exceptions.Timeout()
@@ -302,7 +315,7 @@ class TestMoodleService:
         # Should have been called only once (no retry)
         assert mock_post.call_count == 1
     
-    @patch('requests.post')
+    @patch('requests.Session.post')
     def test_invalid_json_response(self, mock_post, moodle_service):
         """Test handling of invalid JSON responses"""
         mock_response = Mock()
@@ -315,6 +328,26 @@ class TestMoodleService:
         
         assert 'Invalid JSON response' in str(exc_info.value)
         assert exc_info.value.status_code == 502
+    
+    @patch('requests.Session.post')
+    def test_streamed_file_upload(self, mock_post, moodle_service):
+        """Test a file-like upload is sent as a streamed, base64-encoded form body"""
+        mock_response = Mock()
+        mock_response.raise_for_status.return_value = None
+        mock_response.json.return_value = [{'filename': 'test.bin'}]
+        mock_post.return_value = mock_response
+        
+        file_data = os.urandom(3 * 256 * 1024 + 7)
+        result = moodle_service.upload_file_core(io.BytesIO(file_data), filename='test.bin')
+        
+        body = mock_post.call_args[1]['data']
+        assert not isinstance(body, (bytes, str, dict))  # generator, not a prebuilt body
+        
+        fields = parse_qs(b''.join(body).decode('ascii'))
+        assert fields['wsfunction'] == ['core_files_upload']
+        assert fields['filename'] == ['test.bin']
+        assert base64.b64decode(fields['filecontent'][0]) == file_data
+        assert result == [{'filename': 'test.bin'}]
 
 
 class TestMoodleServiceHelpers:
@@ -416,6 +449,17 @@ class TestMoodleServiceHelpers:
         mock_call.assert_called_once_with('core_user_get_users_by_field', expected_params)
         assert len(result) == 2
     
+    @patch('lms_api.services.moodle_service.MoodleService.call')
+    def test_get_users_by_field_batches_large_lists(self, mock_call, moodle_service):
+        """Test get_users_by_field splits very large value lists into batches"""
+        mock_call.side_effect = lambda wsfunction, params: [{'id': v} for v in params['values']]
+        values = list(range(MoodleService.USERS_BY_FIELD_BATCH_SIZE + 5))
+        
+        result = moodle_service.get_users_by_field('id', values)
+        
+        assert mock_call.call_count == 2
+        assert len(result) == len(values)
+    
     @patch('lms_api.services.moodle_service.MoodleService.call')
     def test_enrol_users(self, mock_call, moodle_service):
         """Test enrol_users helper method"""
@@ -435,6 +479,15 @@ class TestMoodleServiceHelpers:
         with pytest.raises(MoodleValidationError, match="Required field missing in enrolment: roleid"):
             moodle_service.enrol_users([{'userid': 123, 'courseid': 456}])
         
+        # Test non-positive / non-numeric IDs
+        with pytest.raises(MoodleValidationError, match=r"Invalid enrolment data.*\(enrolment 1\)"):
+            moodle_service.enrol_users([
+                {'roleid': 5, 'userid': 123, 'courseid': 456},
+                {'roleid': 5, 'userid': 0, 'courseid': 456}
+            ])
+        with pytest.raises(MoodleValidationError, match="Invalid enrolment data"):
+            moodle_service.enrol_users([{'roleid': 5, 'userid': 'abc', 'courseid': 456}])
+        
         # Test empty enrolments list
         result = moodle_service.enrol_users([])
         assert result is None
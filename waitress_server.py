@@ -75,7 +75,7 @@ if __name__ == '__main__':
     print(f"🔗 Backend API: http://jhbnet.ddns.net:46543/api")
     
     try:
-        serve(create_app(), host=host, port=port, threads=6)
+        serve(create_app(), host=host, port=port, threads=int(os.getenv('WAITRESS_THREADS', 24)))
     except KeyboardInterrupt:
         print("\n👋 Server stopped")
     except Exception as e: